@@ -1,17 +1,41 @@
-from dotenv import load_dotenv
-import google.generativeai as genai
-import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Iterable, Iterator, MutableMapping, Sequence
 import numpy as np
-import ast
+from llm.batch import BatchResult, run_batch
+from llm.cache import ResponseCache
+from llm.client import ModelRegistry, get_default_registry
+from llm.embeddings import Embedder, VectorIndex
+from llm.metrics import instrumented
+from llm.parsing import LEARNING_PATH_ITEM, RECOMMENDATION, SKILL_ASSESSMENT
+from skill_matrix import SkillMatrix
+from storage import CachedTable, Storage, get_default_storage
+from user_summary import UserSummaries
+
+LEARNING_PATH_INSTRUCTION = "You are an AI assistant that generates personalized learning paths."
+
 class LLMEnhancedLearningSystem:
-    def __init__(self):
-        load_dotenv()
-        google_api_key=os.getenv('GOOGLE_API_KEY')
-        genai.configure(api_key=google_api_key)
+    def __init__(self, response_cache: ResponseCache | None = None, model_registry: ModelRegistry | None = None,
+                 embedder: Embedder | None = None, prompt_top_k: int = 20, storage: Storage | None = None):
+        self.response_cache = response_cache
+        self.model_registry = model_registry or get_default_registry()
+        # Only the prompt_top_k catalog entries closest to the user's profile are sent to the model
+        self.content_index = VectorIndex(embedder)
+        self.prompt_top_k = prompt_top_k
         
-        self.content_library: Dict[str, Dict[str, Any]] = {}
-        self.user_profiles: Dict[str, Dict[str, Any]] = {}
+        self.storage = storage or get_default_storage()
+        self.content_library: MutableMapping[str, Dict[str, Any]] = CachedTable(
+            self.storage.get_content,
+            lambda content_id, data: self.storage.put_content(content_id, data['title'], data['description'], data['skills']),
+            self.storage.all_content)
+        self.user_profiles: CachedTable = CachedTable(
+            self.storage.get_user, self._save_user, self.storage.all_users)
+        # Rolling per-skill assessment stats; skills scored before these existed seed one attempt each
+        self.skill_summaries = UserSummaries(self.storage, "skill", backfill=self._scored_skills)
+        # Users are loaded into the matrix on first use by recommend_content_batch
+        self.skill_matrix = SkillMatrix()
+        self._skill_matrix_complete = False
+        for content_id, data in self.content_library.items():
+            self.content_index.add(content_id, f"{data['title']} {data['description']} {' '.join(data['skills'])}")
+            self.skill_matrix.set_content(content_id, data['skills'])
        
     
     def add_content(self, content_id: str, title: str, description: str, skills: List[str]):
@@ -20,6 +44,8 @@ class LLMEnhancedLearningSystem:
             "description": description,
             "skills": skills
         }
+        self.content_index.add(content_id, f"{title} {description} {' '.join(skills)}")
+        self.skill_matrix.set_content(content_id, skills)
         
     
     def add_user(self, user_id: str, goals: str, background: str):
@@ -28,11 +54,45 @@ class LLMEnhancedLearningSystem:
             "background": background,
             "skills": {}
         }
+        self.skill_matrix.set_user_skills(user_id, {}, replace=True)
         
     
-    def generate_learning_path(self, user_id: str, num_items: int = 5) -> List[Dict[str, Any]]:
+    @instrumented("learning_system.generate_learning_path")
+    def generate_learning_path(self, user_id: str, num_items: int = 5, use_cache: bool = True, refresh: bool = False) -> List[Dict[str, Any]]:
+        return self.model_registry.generate_items("gemini-1.5-flash", LEARNING_PATH_INSTRUCTION,
+                                                  self._learning_path_prompt(user_id, num_items), LEARNING_PATH_ITEM,
+                                                  self.response_cache, use_cache=use_cache, refresh=refresh)
+
+    @instrumented("learning_system.stream_learning_path")
+    def stream_learning_path(self, user_id: str, num_items: int = 5, use_cache: bool = True,
+                             refresh: bool = False) -> Iterator[Dict[str, Any]]:
+        """Yield learning path items one by one as the model produces them."""
+        yield from self.model_registry.stream_items("gemini-1.5-flash", LEARNING_PATH_INSTRUCTION,
+                                                    self._learning_path_prompt(user_id, num_items), LEARNING_PATH_ITEM,
+                                                    self.response_cache, use_cache=use_cache, refresh=refresh)
+
+    @instrumented("learning_system.generate_learning_path")
+    async def generate_learning_path_async(self, user_id: str, num_items: int = 5, use_cache: bool = True,
+                                           refresh: bool = False) -> List[Dict[str, Any]]:
+        return await self.model_registry.generate_items_async("gemini-1.5-flash", LEARNING_PATH_INSTRUCTION,
+                                                              self._learning_path_prompt(user_id, num_items),
+                                                              LEARNING_PATH_ITEM, self.response_cache,
+                                                              use_cache=use_cache, refresh=refresh)
+
+    async def generate_learning_paths(self, user_ids: Iterable[str], num_items: int = 5, concurrency: int = 8,
+                                      rate_limit: float | None = None, retries: int = 3) -> AsyncIterator[BatchResult]:
+        # Retries skip the cache so an invalid cached response is not replayed
+        jobs = [(user_id, lambda attempt, user_id=user_id: self.generate_learning_path_async(
+                    user_id, num_items, refresh=attempt > 0))
+                for user_id in user_ids]
+        async for result in run_batch(jobs, concurrency=concurrency, rate_limit=rate_limit, retries=retries,
+                                      operation="learning_system.generate_learning_paths"):
+            yield result
+
+    def _learning_path_prompt(self, user_id: str, num_items: int) -> str:
         user_profile = self.user_profiles[user_id]
-        prompt = f"""
+        profile_query = f"{user_profile['goals']} {user_profile['background']}"
+        return f"""
         User Goals: {user_profile['goals']}
         User Background: {user_profile['background']}
 
@@ -41,52 +101,40 @@ class LLMEnhancedLearningSystem:
         of why it's recommended, and how it relates to the user's goals.
 
         Available Content:
-        {self._format_content_for_prompt()}
+        {self._format_content_for_prompt(profile_query)}
 
-        Format the response as a Python list of dictionaries, each containing 
+        Format the response as a JSON array of objects, each containing
         'content_id', 'explanation', and 'relevance_to_goals'.
         """
-        model = genai.GenerativeModel("gemini-1.5-flash",system_instruction="You are an AI assistant that generates personalized learning paths.")
-        response = model.generate_content(prompt)
-        
-        raw_text=response.text
-        learning_path_str = raw_text.replace("```python", "").replace("```", "").strip()
-    
-        learning_path = ast.literal_eval(learning_path_str)
-
-        return learning_path
         
 
-    def recommend_content(self, user_id: str, num_recommendations: int = 3) -> List[Dict[str, Any]]:
+    @instrumented("learning_system.recommend_content")
+    def recommend_content(self, user_id: str, num_recommendations: int = 3, use_cache: bool = True, refresh: bool = False) -> List[Dict[str, Any]]:
         user_profile = self.user_profiles[user_id]
+        profile_query = f"{user_profile['goals']} {user_profile['background']} {' '.join(user_profile['skills'])}"
         prompt = f"""
         User Goals: {user_profile['goals']}
         User Background: {user_profile['background']}
-        User Skills: {user_profile['skills']}
+        User Skills (assessment history):
+        {self.skill_summaries.describe(user_id)}
 
         Based on the user's profile, recommend {num_recommendations} pieces of content. 
         For each recommendation, provide the content ID, a brief explanation of why it's 
         recommended, and how it aligns with the user's current skills and goals.
 
         Available Content:
-        {self._format_content_for_prompt()}
+        {self._format_content_for_prompt(profile_query)}
 
-        Format the response as a Python list of dictionaries, each containing 
+        Format the response as a JSON array of objects, each containing
         'content_id', 'explanation', and 'skill_alignment'.
         """
-    
-        model = genai.GenerativeModel("gemini-1.5-flash",system_instruction="You are an AI assistant that provides personalized content recommendations.")
-        response = model.generate_content(prompt)
-        raw_text=response.text
-        recommend_content_str = raw_text.replace("```python", "").replace("```", "").strip()
-    
-        recommend = ast.literal_eval(recommend_content_str)
 
-       
-
-        return recommend
+        return self.model_registry.generate_items(
+            "gemini-1.5-flash", "You are an AI assistant that provides personalized content recommendations.",
+            prompt, RECOMMENDATION, self.response_cache, use_cache=use_cache, refresh=refresh)
 
-    def assess_skills(self, user_id: str, content_id: str, user_response: str) -> Dict[str, Any]:
+    @instrumented("learning_system.assess_skills")
+    def assess_skills(self, user_id: str, content_id: str, user_response: str, use_cache: bool = True, refresh: bool = False) -> Dict[str, Any]:
         content = self.content_library[content_id]
         prompt = f"""
         Content Title: {content['title']}
@@ -100,34 +148,110 @@ class LLMEnhancedLearningSystem:
         including a score from 0 to 1, and brief feedback on areas of strength 
         and areas for improvement.
 
-        Format the response as a Python dictionary with keys for each skill, 
-        where the values are dictionaries containing 'score' and 'feedback'.
+        Format the response as a JSON array with one object per skill, each
+        containing 'skill', 'score', and 'feedback'.
         """
 
+        items = self.model_registry.generate_items(
+            "gemini-1.5-flash", "You are an AI assistant that assesses user skills based on their responses.",
+            prompt, SKILL_ASSESSMENT, self.response_cache, use_cache=use_cache, refresh=refresh)
+        assessment = {item['skill']: {'score': item['score'], 'feedback': item['feedback']} for item in items}
         
-        model = genai.GenerativeModel("gemini-1.5-flash",system_instruction="You are an AI assistant that assesses user skills based on their responses.")
-        response = model.generate_content(prompt)
+        # A skill's profile score is the EWMA of its assessments
+        with self.storage.batch():
+            updated = {skill: self.skill_summaries.record(user_id, skill, data['score']).ewma
+                       for skill, data in assessment.items()}
+            self.storage.set_skills(user_id, updated)
+            # Reloaded in the same transaction: the cached profile misses other workers' assessments
+            skills = self.user_profiles.refresh(user_id)['skills']
+        if user_id in self.skill_matrix:
+            self.skill_matrix.set_user_skills(user_id, skills, replace=True)
 
-        raw_text=response.text
-        recommend_content_str = raw_text.replace("```python", "").replace("```", "").strip()
+        return assessment
 
-        assessment = ast.literal_eval(recommend_content_str)
-        
-        # Update user's skills in their profile
-        for skill, data in assessment.items():
-            if skill in self.user_profiles[user_id]['skills']:
-                # If skill exists, update with a weighted average
-                current_score = self.user_profiles[user_id]['skills'][skill]
-                new_score = (current_score + data['score']) / 2
-            else:
-                new_score = data['score']
-            self.user_profiles[user_id]['skills'][skill] = new_score
+    @instrumented("learning_system.recommend_content_batch")
+    def recommend_content_batch(self, user_ids: Sequence[str] | None = None,
+                                k: int = 3) -> Dict[str, List[Dict[str, Any]]]:
+        """Top-k content per user by skill gap, computed locally for every user at once.
 
-        return assessment
+        Content scores by how far the user is from mastering its skills (the
+        average of 1 - skill score), so no LLM call is made; pass the result
+        to explain_recommendations() for written explanations of the picks.
+        user_ids=None covers every stored user.
+        """
+        self._load_skill_matrix(user_ids)
+        return {user_id: [{"content_id": content_id, "gap_score": round(gap, 4),
+                           "skill_gaps": [skill for skill, _ in self.skill_matrix.skill_gaps(user_id, content_id)]}
+                          for content_id, gap in picks]
+                for user_id, picks in self.skill_matrix.top_k(user_ids, k).items()}
+
+    async def explain_recommendations(self, recommendations: Dict[str, List[Dict[str, Any]]], concurrency: int = 8,
+                                      rate_limit: float | None = None, retries: int = 3) -> AsyncIterator[BatchResult]:
+        """Add 'explanation' and 'skill_alignment' to each user's picks, one LLM call per user."""
+        jobs = [(user_id, lambda attempt, user_id=user_id, picks=picks: self._explain_picks(
+                    user_id, picks, refresh=attempt > 0))
+                for user_id, picks in recommendations.items() if picks]
+        async for result in run_batch(jobs, concurrency=concurrency, rate_limit=rate_limit, retries=retries,
+                                      operation="learning_system.explain_recommendations"):
+            yield result
+
+    @instrumented("learning_system.explain_recommendations")
+    async def _explain_picks(self, user_id: str, picks: List[Dict[str, Any]], refresh: bool = False) -> List[Dict[str, Any]]:
+        user_profile = self.user_profiles[user_id]
+        chosen = "\n".join(f"ID: {pick['content_id']}, Title: {self.content_library[pick['content_id']]['title']}, "
+                           f"Skills to improve: {', '.join(pick['skill_gaps']) or 'none'}" for pick in picks)
+        prompt = f"""
+        User Goals: {user_profile['goals']}
+        User Background: {user_profile['background']}
+        User Skills (assessment history):
+        {self.skill_summaries.describe(user_id)}
+
+        The following content has already been chosen for this user because it
+        covers the skills they have not mastered yet. For each item, explain why
+        it is recommended and how it aligns with the user's current skills and goals.
+
+        Chosen Content:
+        {chosen}
+
+        Format the response as a JSON array of objects, each containing
+        'content_id', 'explanation', and 'skill_alignment'.
+        """
+        items = await self.model_registry.generate_items_async(
+            "gemini-1.5-flash", "You are an AI assistant that provides personalized content recommendations.",
+            prompt, RECOMMENDATION, self.response_cache, refresh=refresh)
+        explained = {item['content_id']: item for item in items}
+        return [{**pick, "explanation": explained.get(pick['content_id'], {}).get('explanation', ""),
+                 "skill_alignment": explained.get(pick['content_id'], {}).get('skill_alignment', "")}
+                for pick in picks]
+
+    def _load_skill_matrix(self, user_ids: Sequence[str] | None):
+        if user_ids is None:
+            if not self._skill_matrix_complete:
+                for user_id, profile in self.user_profiles.items():
+                    self.skill_matrix.set_user_skills(user_id, profile['skills'], replace=True)
+                self._skill_matrix_complete = True
+            return
+        for user_id in user_ids:
+            if user_id not in self.skill_matrix:
+                self.skill_matrix.set_user_skills(user_id, self.user_profiles[user_id]['skills'], replace=True)
+
+    def _scored_skills(self, user_id: str) -> List[tuple]:
+        # Runs inside the summary's write transaction, so read the stored skills rather than the cache
+        user = self.storage.get_user(user_id)
+        return list(user['skills'].items()) if user is not None else []
+
+    def _save_user(self, user_id: str, profile: Dict[str, Any]):
+        with self.storage.batch():
+            self.storage.put_user(user_id, profile['goals'], profile['background'])
+            self.storage.set_skills(user_id, profile['skills'], replace=True)
 
-    def _format_content_for_prompt(self) -> str:
-        return "\n".join([f"ID: {cid}, Title: {data['title']}, Skills: {', '.join(data['skills'])}" 
-                          for cid, data in self.content_library.items()])
+    def _format_content_for_prompt(self, query: str | None = None) -> str:
+        content_ids = list(self.content_library)
+        if query is not None and len(content_ids) > self.prompt_top_k:
+            content_ids = [cid for cid, _ in self.content_index.top_k(query, self.prompt_top_k)]
+        return "\n".join([f"ID: {cid}, Title: {self.content_library[cid]['title']}, "
+                          f"Skills: {', '.join(self.content_library[cid]['skills'])}"
+                          for cid in content_ids])
         
     
     
@@ -1,20 +1,114 @@
-from dotenv import load_dotenv
-import google.generativeai as genai
-import os
-from typing import List, Dict, Any
-import ast
+from typing import List, Dict, Any, AsyncIterator, Iterable, Iterator, Mapping, MutableMapping, Sequence, Tuple
+import threading
+from llm.batch import BatchResult, run_batch
+from llm.cache import ResponseCache
+from llm.client import ModelRegistry, get_default_registry
+from llm.metrics import instrumented
+from llm.parsing import QUIZ_QUESTION
+from quiz_grading import QuizHistory, encode_answer_key, encode_submissions, grade_matrix
+from quiz_pool import QuizPool, quiz_key
+from storage import CachedTable, Storage, get_default_storage
+from user_summary import UserSummaries
+
+QUIZ_SYSTEM_INSTRUCTION = """
+You are a teacher creating mathematical and logical quiz questions. Your task:
+1. Summarize the key concepts that the quiz should test.
+2. Identify the problem type (e.g., arithmetic, logic, geometry).
+3. Formulate a clear, concise quiz question.
+4. Provide an answer key with an explanation for each step.
+
+Ensure simplicity, clarity, and correctness in both the question and the explanation. Each task should be done in the given order and separately.
+"""
+FEEDBACK_INSTRUCTION = "You are an AI assistant that provides personalized educational feedback."
+NEXT_QUIZ_INSTRUCTION = "You are an AI assistant that provides personalized quiz recommendations."
+
+NO_QUIZ_RESULT_MESSAGE = "No quiz result found for this user and quiz combination."
+NO_QUIZ_HISTORY_MESSAGE = "No quiz history found. Please take a quiz first."
 
 class LLMEnhancedQuizPlatform:
-    def __init__(self):
-        load_dotenv()
-        google_api_key = os.getenv('GOOGLE_API_KEY')
-        genai.configure(api_key=google_api_key)
+    def __init__(self, response_cache: ResponseCache | None = None, model_registry: ModelRegistry | None = None,
+                 storage: Storage | None = None):
+        self.response_cache = response_cache
+        self.model_registry = model_registry or get_default_registry()
         
-        self.quizzes: Dict[str, Dict[str, Any]] = {}
-        self.user_profiles: Dict[str, Dict[str, Any]] = {}
+        self.storage = storage or get_default_storage()
+        self.quizzes: MutableMapping[str, Dict[str, Any]] = CachedTable(
+            self.storage.get_quiz,
+            lambda quiz_id, quiz: self.storage.put_quiz(quiz_id, quiz['topic'], quiz['difficulty'], quiz['questions']),
+            self.storage.all_quizzes)
+        # Quiz history is persisted attempt by attempt in _update_user_profile, so saving a profile is a no-op
+        self.user_profiles: CachedTable = CachedTable(
+            self._load_user_profile, lambda user_id, profile: None,
+            lambda: {user_id: {'quiz_history': history} for user_id, history in self.storage.all_attempts().items()})
+        # (user_id, quiz_id) -> attempts index, filled per user from the stored history on first use
+        self.history = QuizHistory()
+        self._indexed_users: set = set()
+        self._history_lock = threading.RLock()
+        # Rolling per-topic stats that keep the recommendation prompts a fixed size
+        self.quiz_summaries = UserSummaries(self.storage, "quiz", backfill=self._scored_attempts)
+        self.quiz_pool: QuizPool | None = None
+
+    def enable_quiz_pool(self, low_watermark: int = 2, high_watermark: int = 5, workers: int = 2,
+                         max_age: float | None = 24 * 60 * 60, wait_timeout: float = 0.0) -> QuizPool:
+        # Pooled quizzes skip the response cache, otherwise every refill would return the same quiz
+        refill = instrumented("quiz_platform.quiz_pool_refill")(
+            lambda topic, difficulty, num_questions: self._generate_questions(
+                topic, difficulty, num_questions, use_cache=False))
+        self.quiz_pool = QuizPool(refill, low_watermark=low_watermark, high_watermark=high_watermark,
+                                  workers=workers, max_age=max_age, wait_timeout=wait_timeout)
+        return self.quiz_pool
     
-    def create_quiz(self, quiz_id: str, topic: str, difficulty: str, num_questions: int) -> Dict[str, Any]:
-        prompt = f"""
+    @instrumented("quiz_platform.create_quiz")
+    def create_quiz(self, quiz_id: str, topic: str, difficulty: str, num_questions: int,
+                    use_cache: bool = True, refresh: bool = False) -> Dict[str, Any]:
+        questions = None
+        if self.quiz_pool is not None and use_cache and not refresh:
+            questions = self.quiz_pool.take(topic, difficulty, num_questions)
+        if questions is None:
+            questions = self._generate_questions(topic, difficulty, num_questions, use_cache, refresh)
+        return self._store_quiz(quiz_id, topic, difficulty, questions)
+
+    def _generate_questions(self, topic: str, difficulty: str, num_questions: int,
+                            use_cache: bool = True, refresh: bool = False) -> List[Dict[str, Any]]:
+        return self.model_registry.generate_items("gemini-1.5-pro", QUIZ_SYSTEM_INSTRUCTION,
+                                                  self._quiz_prompt(topic, difficulty, num_questions), QUIZ_QUESTION,
+                                                  self.response_cache, use_cache=use_cache, refresh=refresh)
+
+    @instrumented("quiz_platform.stream_quiz")
+    def stream_quiz(self, quiz_id: str, topic: str, difficulty: str, num_questions: int,
+                    use_cache: bool = True, refresh: bool = False) -> Iterator[Dict[str, Any]]:
+        """Yield each question as soon as it is generated; the quiz is stored once all have arrived."""
+        questions = []
+        for question in self.model_registry.stream_items("gemini-1.5-pro", QUIZ_SYSTEM_INSTRUCTION,
+                                                         self._quiz_prompt(topic, difficulty, num_questions),
+                                                         QUIZ_QUESTION, self.response_cache,
+                                                         use_cache=use_cache, refresh=refresh):
+            questions.append(question)
+            yield question
+        self._store_quiz(quiz_id, topic, difficulty, questions)
+
+    @instrumented("quiz_platform.create_quiz")
+    async def create_quiz_async(self, quiz_id: str, topic: str, difficulty: str, num_questions: int,
+                                use_cache: bool = True, refresh: bool = False) -> Dict[str, Any]:
+        questions = await self.model_registry.generate_items_async("gemini-1.5-pro", QUIZ_SYSTEM_INSTRUCTION,
+                                                                   self._quiz_prompt(topic, difficulty, num_questions),
+                                                                   QUIZ_QUESTION, self.response_cache,
+                                                                   use_cache=use_cache, refresh=refresh)
+        return self._store_quiz(quiz_id, topic, difficulty, questions)
+
+    async def create_quizzes(self, specs: Iterable[Dict[str, Any]], concurrency: int = 8,
+                             rate_limit: float | None = None, retries: int = 3) -> AsyncIterator[BatchResult]:
+        # Each spec holds the create_quiz arguments: quiz_id, topic, difficulty, num_questions
+        jobs = [(spec['quiz_id'], lambda attempt, spec=spec: self.create_quiz_async(**spec, refresh=attempt > 0))
+                for spec in specs]
+        async for result in run_batch(jobs, concurrency=concurrency, rate_limit=rate_limit, retries=retries,
+                                      operation="quiz_platform.create_quizzes"):
+            yield result
+
+    def _quiz_prompt(self, topic: str, difficulty: str, num_questions: int) -> str:
+        # Collapse stray whitespace so identical requests share one prompt, cache entry, pool and API call
+        topic, difficulty, _ = quiz_key(topic, difficulty, num_questions)
+        return f"""
         Create a quiz on the topic of {topic} with {num_questions} questions.
         The difficulty level should be {difficulty}.
         For each question, provide:
@@ -23,30 +117,15 @@ class LLMEnhancedQuizPlatform:
         3. The correct answer (A, B, C, or D)
         4. A brief explanation of the correct answer
 
-        Format the response as a Python list of dictionaries, each containing
+        Format the response as a JSON array of objects, each containing
         'question', 'options', 'correct_answer', and 'explanation'.
         """
-        
-        
-        
-        model = genai.GenerativeModel("gemini-1.5-pro", system_instruction="""
-You are a teacher creating mathematical and logical quiz questions. Your task:
-1. Summarize the key concepts that the quiz should test.
-2. Identify the problem type (e.g., arithmetic, logic, geometry).
-3. Formulate a clear, concise quiz question.
-4. Provide an answer key with an explanation for each step.
 
-Ensure simplicity, clarity, and correctness in both the question and the explanation. Each task should be done in the given order and separately.
-""")
-        response = model.generate_content(prompt)
-        
-        raw_text = response.text
-        quiz_content = ast.literal_eval(raw_text.replace("```python", "").replace("```", "").strip())
-        
+    def _store_quiz(self, quiz_id: str, topic: str, difficulty: str, questions: List[Dict[str, Any]]) -> Dict[str, Any]:
         self.quizzes[quiz_id] = {
             "topic": topic,
             "difficulty": difficulty,
-            "questions": quiz_content
+            "questions": questions
         }
         
         return self.quizzes[quiz_id]
@@ -78,29 +157,150 @@ Ensure simplicity, clarity, and correctness in both the question and the explana
         
         return result
     
+    def grade_batch(self, quiz_id: str, submissions: Mapping[str, Sequence[str]] | Iterable[Tuple[str, Sequence[str]]]) -> Dict[str, Any]:
+        """Grade many users' answers to one quiz in a single vectorised pass.
+
+        All attempts are recorded in one storage transaction. Returns the
+        per-user scores, the correctness matrix, and per-question correct rate
+        and item difficulty, all as NumPy arrays aligned with user_ids.
+        """
+        quiz = self.quizzes[quiz_id]
+        pairs = list(submissions.items()) if isinstance(submissions, Mapping) else list(submissions)
+        user_ids = [user_id for user_id, _ in pairs]
+        answer_key = encode_answer_key(quiz['questions'])
+        graded = grade_matrix(answer_key, encode_submissions([answers for _, answers in pairs], len(answer_key)))
+        
+        total_questions = len(quiz['questions'])
+        with self.storage.batch():
+            for user_id, score in zip(user_ids, graded['scores'].tolist()):
+                self._update_user_profile(user_id, quiz_id, {'score': score, 'total_questions': total_questions})
+        
+        return {
+            'quiz_id': quiz_id,
+            'user_ids': user_ids,
+            'total_questions': total_questions,
+            'scores': graded['scores'],
+            'correct': graded['correct'],
+            'correct_rate': graded['correct_rate'],
+            'item_difficulty': graded['item_difficulty'],
+            'mean_score': float(graded['scores'].mean()) if user_ids else 0.0
+        }
+
+    def latest_attempt(self, user_id: str, quiz_id: str) -> Dict[str, Any] | None:
+        self._refresh_history(user_id)
+        return self.history.latest(user_id, quiz_id)
+
+    def best_attempt(self, user_id: str, quiz_id: str) -> Dict[str, Any] | None:
+        self._refresh_history(user_id)
+        return self.history.best(user_id, quiz_id)
+    
     def _update_user_profile(self, user_id: str, quiz_id: str, result: Dict[str, Any]):
-        if user_id not in self.user_profiles:
-            self.user_profiles[user_id] = {'quiz_history': []}
+        # Load the stored history before recording the attempt so it is not counted twice
+        self._index_history(user_id, create=True)
+        self.quiz_summaries.get(user_id)
+        attempt = self.storage.add_attempt(user_id, quiz_id, result['score'], result['total_questions'])
+        self.quiz_summaries.record(user_id, self._quiz_topic(quiz_id),
+                                   result['score'] / result['total_questions'] if result['total_questions'] else 0.0)
         
-        self.user_profiles[user_id]['quiz_history'].append({
+        entry = {
             'quiz_id': quiz_id,
+            'attempt': attempt,
             'score': result['score'],
             'total_questions': result['total_questions']
-        })
+        }
+        self.user_profiles[user_id]['quiz_history'].append(entry)
+        self.history.record(user_id, quiz_id, entry)
+
+    def _index_history(self, user_id: str, create: bool = False):
+        if user_id in self._indexed_users:
+            return
+        # Load before taking _history_lock and never touch storage while holding it:
+        # grade_batch gets here inside storage.batch(), i.e. holding the storage lock
+        profile = self.user_profiles.get(user_id)
+        if profile is None and not create:
+            return
+        with self._history_lock:
+            if user_id in self._indexed_users:
+                return
+            if profile is None:
+                # Saving a profile is a no-op, so this only fills the cache
+                self.user_profiles[user_id] = profile = {'quiz_history': []}
+            for entry in profile['quiz_history']:
+                self.history.record(user_id, entry['quiz_id'], entry)
+            self._indexed_users.add(user_id)
+
+    def _refresh_history(self, user_id: str):
+        # Reloaded before serving: the cached profile misses other workers' attempts
+        try:
+            profile = self.user_profiles.refresh(user_id)
+        except KeyError:
+            return
+        for entry in profile['quiz_history']:
+            self.history.record(user_id, entry['quiz_id'], entry)
+
+    def _quiz_topic(self, quiz_id: str) -> str:
+        quiz = self.quizzes.get(quiz_id)
+        return quiz['topic'] if quiz is not None else quiz_id
+
+    def _scored_attempts(self, user_id: str) -> List[Tuple[str, float]]:
+        return [(self._quiz_topic(entry['quiz_id']),
+                 entry['score'] / entry['total_questions'] if entry['total_questions'] else 0.0)
+                for entry in self.storage.attempts(user_id)]
+
+    def _load_user_profile(self, user_id: str) -> Dict[str, Any] | None:
+        history = self.storage.attempts(user_id)
+        return {'quiz_history': history} if history else None
     
-    def get_personalized_feedback(self, user_id: str, quiz_id: str) -> str:
-        user_profile = self.user_profiles.get(user_id, {})
-        quiz_result = next((q for q in user_profile.get('quiz_history', []) if q['quiz_id'] == quiz_id), None)
+    @instrumented("quiz_platform.get_personalized_feedback")
+    def get_personalized_feedback(self, user_id: str, quiz_id: str, use_cache: bool = True, refresh: bool = False) -> str:
+        prompt = self._feedback_prompt(user_id, quiz_id)
+        if prompt is None:
+            return NO_QUIZ_RESULT_MESSAGE
+        
+        return self._generate_text("gemini-1.5-pro", FEEDBACK_INSTRUCTION, prompt, use_cache, refresh)
+
+    @instrumented("quiz_platform.stream_personalized_feedback")
+    def stream_personalized_feedback(self, user_id: str, quiz_id: str, use_cache: bool = True,
+                                     refresh: bool = False) -> Iterator[str]:
+        prompt = self._feedback_prompt(user_id, quiz_id)
+        if prompt is None:
+            yield NO_QUIZ_RESULT_MESSAGE
+            return
+        yield from self.model_registry.stream_text("gemini-1.5-pro", FEEDBACK_INSTRUCTION, prompt, self.response_cache,
+                                                   use_cache=use_cache, refresh=refresh)
+    
+    @instrumented("quiz_platform.recommend_next_quiz")
+    def recommend_next_quiz(self, user_id: str, use_cache: bool = True, refresh: bool = False) -> str:
+        prompt = self._next_quiz_prompt(user_id)
+        if prompt is None:
+            return NO_QUIZ_HISTORY_MESSAGE
+        
+        return self._generate_text("gemini-1.5-pro", NEXT_QUIZ_INSTRUCTION, prompt, use_cache, refresh)
+
+    @instrumented("quiz_platform.stream_next_quiz_recommendation")
+    def stream_next_quiz_recommendation(self, user_id: str, use_cache: bool = True,
+                                        refresh: bool = False) -> Iterator[str]:
+        prompt = self._next_quiz_prompt(user_id)
+        if prompt is None:
+            yield NO_QUIZ_HISTORY_MESSAGE
+            return
+        yield from self.model_registry.stream_text("gemini-1.5-pro", NEXT_QUIZ_INSTRUCTION, prompt, self.response_cache,
+                                                   use_cache=use_cache, refresh=refresh)
+
+    def _feedback_prompt(self, user_id: str, quiz_id: str) -> str | None:
+        quiz_result = self.latest_attempt(user_id, quiz_id)
         
         if not quiz_result:
-            return "No quiz result found for this user and quiz combination."
+            return None
         
         quiz = self.quizzes[quiz_id]
+        topic_stats = self.quiz_summaries.get(user_id).get(quiz['topic'])
         
-        prompt = f"""
+        return f"""
         Quiz Topic: {quiz['topic']}
         Quiz Difficulty: {quiz['difficulty']}
         User's Score: {quiz_result['score']} out of {quiz_result['total_questions']}
+        User's History on This Topic: {topic_stats.describe(quiz['topic']) if topic_stats else 'None'}
         
         Based on the user's performance, provide personalized feedback and suggestions for improvement.
         Include:
@@ -109,22 +309,14 @@ Ensure simplicity, clarity, and correctness in both the question and the explana
         3. Areas that need improvement
         4. Recommended next steps or topics to study
         """
+
+    def _next_quiz_prompt(self, user_id: str) -> str | None:
+        if not self.quiz_summaries.get(user_id):
+            return None
         
-        model = genai.GenerativeModel("gemini-1.5-pro", system_instruction="You are an AI assistant that provides personalized educational feedback.")
-        response = model.generate_content(prompt)
-        
-        return response.text
-    
-    def recommend_next_quiz(self, user_id: str) -> str:
-        user_profile = self.user_profiles.get(user_id, {})
-        quiz_history = user_profile.get('quiz_history', [])
-        
-        if not quiz_history:
-            return "No quiz history found. Please take a quiz first."
-        
-        prompt = f"""
-        User's Quiz History:
-        {quiz_history}
+        return f"""
+        User's Quiz Performance by Topic:
+        {self.quiz_summaries.describe(user_id)}
         
         Available Quizzes:
         {[{quiz_id: info['topic']} for quiz_id, info in self.quizzes.items()]}
@@ -132,11 +324,11 @@ Ensure simplicity, clarity, and correctness in both the question and the explana
         Based on the user's quiz history and available quizzes, recommend the next quiz they should take.
         Provide the quiz ID and a brief explanation for your recommendation.
         """
-        
-        model = genai.GenerativeModel("gemini-1.5-pro", system_instruction="You are an AI assistant that provides personalized quiz recommendations.")
-        response = model.generate_content(prompt)
-        
-        return response.text
+
+    def _generate_text(self, model_name: str, system_instruction: str, prompt: str,
+                       use_cache: bool = True, refresh: bool = False) -> str:
+        return self.model_registry.generate_text(model_name, system_instruction, prompt, self.response_cache,
+                                                 use_cache=use_cache, refresh=refresh)
 
 # Example usage
 if __name__ == "__main__":
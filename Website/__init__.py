@@ -1,11 +1,44 @@
+import os
+import threading
 from flask import Flask
+from LLMEnhancedQuizPlatform import LLMEnhancedQuizPlatform
+from .counters import SQLiteCounterStore
+from .event_log import EventLog
 from .recommendation_system import LLMEnhancedRecommendationSystem
+from .video_manifest import VideoManifest
+
+
+# Point VIDEO_COUNTERS_DB at a file to share view/like counts between worker processes
+counters_db = os.getenv("VIDEO_COUNTERS_DB")
+# Point VIDEO_EVENT_LOG_DIR at a directory to log views/likes for trending (window=/half_life=) queries
+event_log_dir = os.getenv("VIDEO_EVENT_LOG_DIR")
+recommender = LLMEnhancedRecommendationSystem(counter_store=SQLiteCounterStore(counters_db) if counters_db else None,
+                                              event_log=EventLog(event_log_dir) if event_log_dir else None)
+# Built on first use: importing Website must not open (and create) the $BYTESIZE_DB file
+_quiz_platform: LLMEnhancedQuizPlatform | None = None
+_quiz_platform_lock = threading.Lock()
+# Scanned once at startup; restart (or call video_manifest.reload()) after adding videos.
+# VIDEO_FASTSTART=1 also rewrites them for faststart while scanning; otherwise run mp4_faststart.py on ingest
+video_manifest = VideoManifest(os.path.join(os.path.dirname(__file__), "static", "videos"),
+                               optimize=os.getenv("VIDEO_FASTSTART") == "1")
+
+
+def get_quiz_platform() -> LLMEnhancedQuizPlatform:
+    global _quiz_platform
+    with _quiz_platform_lock:
+        if _quiz_platform is None:
+            _quiz_platform = LLMEnhancedQuizPlatform()
+        return _quiz_platform
 
 
-recommender = LLMEnhancedRecommendationSystem()
 def create_app():
     app=Flask(__name__)
     app.config['SECRET_KEY']= "HELLO"
+    # Request profiling: PROFILER_ENABLED=1 allows ?profile=1 on any page, PROFILE_ALL_REQUESTS=1
+    # samples every request and keeps those slower than PROFILE_SLOW_SECONDS (see /metrics/profiles)
+    app.config['PROFILER_ENABLED'] = os.getenv("PROFILER_ENABLED") == "1"
+    app.config['PROFILE_ALL_REQUESTS'] = os.getenv("PROFILE_ALL_REQUESTS") == "1"
+    app.config['PROFILE_SLOW_SECONDS'] = float(os.getenv("PROFILE_SLOW_SECONDS", "1.0"))
     
     from .routesName import routesPages
 
@@ -0,0 +1,145 @@
+import heapq
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Tuple
+import numpy as np
+from .Video import Video
+
+
+class VideoCatalog:
+    """Video store with name and tag indexes and incrementally maintained counters.
+
+    Views and likes must go through record_view/record_like so the per-tag
+    aggregates and the NumPy counter columns stay in step with the videos.
+    Each video owns a fixed slot, which is its row in the counter columns.
+    """
+
+    def __init__(self):
+        self._videos: List[Video] = []
+        self._slots: Dict[str, int] = {}
+        self._by_tag: Dict[str, List[Video]] = {}
+        self._tag_views: Dict[str, int] = {}
+        self._tag_likes: Dict[str, int] = {}
+        self._views = np.zeros(64, dtype=np.int64)
+        self._likes = np.zeros(64, dtype=np.int64)
+        # POSIX timestamps, NaN for never viewed
+        self._last_viewed = np.full(64, np.nan)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._videos)
+
+    def __iter__(self) -> Iterator[Video]:
+        return iter(self._videos)
+
+    def __contains__(self, video_name: str) -> bool:
+        return video_name in self._slots
+
+    @property
+    def videos(self) -> List[Video]:
+        # The backing list itself, to avoid a copy per call; callers must not mutate it
+        return self._videos
+
+    def add(self, video: Video):
+        with self._lock:
+            slot = self._slots.get(video.name)
+            if slot is None:
+                slot = len(self._videos)
+                self._videos.append(video)
+                self._slots[video.name] = slot
+                if slot == len(self._views):
+                    self._grow()
+            else:
+                # Same name replaces the old video in place and keeps its slot
+                self._unindex(self._videos[slot])
+                self._videos[slot] = video
+            self._by_tag.setdefault(video.tag, []).append(video)
+            self._tag_views[video.tag] = self._tag_views.get(video.tag, 0) + video.views
+            self._tag_likes[video.tag] = self._tag_likes.get(video.tag, 0) + video.likes
+            self._write_counters(slot, video)
+
+    def _grow(self):
+        capacity = len(self._views) * 2
+        self._views = np.resize(self._views, capacity)
+        self._likes = np.resize(self._likes, capacity)
+        last_viewed = np.full(capacity, np.nan)
+        last_viewed[:len(self._last_viewed)] = self._last_viewed
+        self._last_viewed = last_viewed
+
+    def _unindex(self, video: Video):
+        self._by_tag[video.tag].remove(video)
+        self._tag_views[video.tag] -= video.views
+        self._tag_likes[video.tag] -= video.likes
+
+    def _write_counters(self, slot: int, video: Video):
+        self._views[slot] = video.views
+        self._likes[slot] = video.likes
+        self._last_viewed[slot] = video.last_viewed.timestamp() if video.last_viewed else np.nan
+
+    def get(self, video_name: str) -> Video | None:
+        slot = self._slots.get(video_name)
+        return self._videos[slot] if slot is not None else None
+
+    def slot(self, video_name: str) -> int | None:
+        return self._slots.get(video_name)
+
+    def by_tag(self, tag: str) -> List[Video]:
+        return list(self._by_tag.get(tag, []))
+
+    def record_view(self, video_name: str) -> Video | None:
+        slot = self._slots.get(video_name)
+        if slot is None:
+            return None
+        with self._lock:
+            video = self._videos[slot]
+            video.view()
+            self._tag_views[video.tag] += 1
+            self._views[slot] += 1
+            self._last_viewed[slot] = video.last_viewed.timestamp()
+        return video
+
+    def record_like(self, video_name: str) -> Video | None:
+        slot = self._slots.get(video_name)
+        if slot is None:
+            return None
+        with self._lock:
+            video = self._videos[slot]
+            video.add_like()
+            self._tag_likes[video.tag] += 1
+            self._likes[slot] += 1
+        return video
+
+    def apply_counts(self, video_name: str, views: int, likes: int, last_viewed: datetime | None):
+        """Overwrite a video's counters with externally aggregated totals."""
+        slot = self._slots.get(video_name)
+        if slot is None:
+            return None
+        with self._lock:
+            video = self._videos[slot]
+            self._tag_views[video.tag] += views - video.views
+            self._tag_likes[video.tag] += likes - video.likes
+            video.views = views
+            video.likes = likes
+            if last_viewed is not None:
+                video.last_viewed = last_viewed
+            self._write_counters(slot, video)
+        return video
+
+    def counter_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Copies of the (views, likes, last_viewed) columns, indexed by slot."""
+        with self._lock:
+            n = len(self._videos)
+            return self._views[:n].copy(), self._likes[:n].copy(), self._last_viewed[:n].copy()
+
+    def popular_tags(self, n: int = 3) -> List[str]:
+        # O(T log n) over tags, never over videos; ties keep insertion order like sorted()
+        with self._lock:
+            return heapq.nlargest(n, self._tag_views, key=self._tag_views.__getitem__)
+
+    def tag_stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {tag: {"likes": self._tag_likes[tag], "views": views} for tag, views in self._tag_views.items()}
+
+    def video_stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {video.name: {"likes": video.likes, "views": video.views} for video in self._videos}
@@ -0,0 +1,180 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Protocol, Tuple
+
+# name -> (views, likes, last_viewed timestamp or None)
+CounterTotals = Dict[str, Tuple[int, int, float | None]]
+
+
+class CounterStore(Protocol):
+    def increment(self, name: str, views: int = 0, likes: int = 0, viewed_at: float | None = None):
+        ...
+
+    def changes_since(self, since: float) -> Tuple[CounterTotals, float]:
+        ...
+
+    def flush(self):
+        ...
+
+    def close(self):
+        ...
+
+
+class SQLiteCounterStore:
+    """View/like counters shared by every worker process on one host.
+
+    increment() only adds to an in-process buffer; a background thread folds
+    the buffer into a WAL-mode SQLite table in one transaction per
+    flush_interval, using additive upserts so concurrent workers never lose
+    each other's counts. With synchronous=NORMAL, WAL commits do not fsync.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0, busy_timeout: float = 5.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.busy_timeout = busy_timeout
+        self._pending: Dict[str, list] = {}
+        # Deltas taken out of _pending by a flush that has not committed yet
+        self._inflight: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pid = None
+        self._db = None
+        self._stop = threading.Event()
+        self._thread = None
+        atexit.register(self.close)
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections and threads do not survive fork(), so set up lazily per process
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pending = {}
+                    self._inflight = {}
+                    self._db = sqlite3.connect(self.path, timeout=self.busy_timeout,
+                                               check_same_thread=False, isolation_level=None)
+                    self._db.execute("PRAGMA journal_mode=WAL")
+                    self._db.execute("PRAGMA synchronous=NORMAL")
+                    self._db.execute(
+                        "CREATE TABLE IF NOT EXISTS video_counters ("
+                        "name TEXT PRIMARY KEY, views INTEGER NOT NULL DEFAULT 0, "
+                        "likes INTEGER NOT NULL DEFAULT 0, last_viewed REAL, updated REAL NOT NULL)"
+                    )
+                    self._db.execute(
+                        "CREATE INDEX IF NOT EXISTS video_counters_updated ON video_counters (updated)"
+                    )
+                    self._stop.clear()
+                    self._thread = threading.Thread(target=self._flush_loop, name="video-counter-flush",
+                                                    daemon=True)
+                    self._thread.start()
+                    self._pid = os.getpid()
+        return self._db
+
+    def increment(self, name: str, views: int = 0, likes: int = 0, viewed_at: float | None = None):
+        self._connection()
+        with self._lock:
+            _add_delta(self._pending, name, views, likes, viewed_at)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error:
+                # e.g. another worker held the write lock past busy_timeout; the
+                # deltas were put back and go out with the next flush
+                pass
+
+    def flush(self):
+        db = self._connection()
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                self._inflight, self._pending = self._pending, {}
+            with self._db_lock:
+                try:
+                    db.execute("BEGIN IMMEDIATE")
+                    # Stamped once the write lock is held: BEGIN can wait up to busy_timeout
+                    # for other workers, and changes_since only allows for commit latency
+                    now = time.time()
+                    db.executemany(
+                        "INSERT INTO video_counters (name, views, likes, last_viewed, updated) "
+                        "VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT(name) DO UPDATE SET views = views + excluded.views, "
+                        "likes = likes + excluded.likes, "
+                        "last_viewed = MAX(COALESCE(last_viewed, 0), COALESCE(excluded.last_viewed, 0)), "
+                        "updated = excluded.updated",
+                        [(name, views, likes, viewed_at, now)
+                         for name, (views, likes, viewed_at) in self._inflight.items()],
+                    )
+                    db.execute("COMMIT")
+                except sqlite3.Error:
+                    if db.in_transaction:
+                        db.execute("ROLLBACK")
+                    with self._lock:
+                        for name, (views, likes, viewed_at) in self._inflight.items():
+                            _add_delta(self._pending, name, views, likes, viewed_at)
+                        self._inflight = {}
+                    raise
+                # Cleared while still holding _db_lock so readers never see the
+                # committed rows and the in-flight deltas at the same time
+                with self._lock:
+                    self._inflight = {}
+
+    def changes_since(self, since: float) -> Tuple[CounterTotals, float]:
+        """Host-wide totals for counters updated at or after `since`.
+
+        Totals include this process's unflushed deltas. Returns the totals and
+        the timestamp to pass as `since` next time.
+        """
+        db = self._connection()
+        # Step back one flush interval so a commit stamped just before this read but
+        # not yet visible to it is picked up next time
+        checkpoint = time.time() - self.flush_interval
+        with self._db_lock:
+            with self._lock:
+                local: Dict[str, list] = {}
+                for deltas in (self._inflight, self._pending):
+                    for name, (views, likes, viewed_at) in deltas.items():
+                        _add_delta(local, name, views, likes, viewed_at)
+            rows = db.execute(
+                "SELECT name, views, likes, last_viewed FROM video_counters WHERE updated >= ?", (since,)
+            ).fetchall()
+        totals: CounterTotals = {}
+        for name, views, likes, last_viewed in rows:
+            delta = local.get(name)
+            if delta is not None:
+                views += delta[0]
+                likes += delta[1]
+                if delta[2] is not None:
+                    last_viewed = max(last_viewed or 0, delta[2])
+            # The upsert stores "never viewed" as 0
+            totals[name] = (views, likes, last_viewed or None)
+        return totals, checkpoint
+
+    def close(self):
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self.flush()
+        finally:
+            with self._db_lock:
+                self._db.close()
+            self._pid = None
+
+
+def _add_delta(deltas: Dict[str, list], name: str, views: int, likes: int, viewed_at: float | None):
+    delta = deltas.get(name)
+    if delta is None:
+        delta = deltas[name] = [0, 0, None]
+    delta[0] += views
+    delta[1] += likes
+    if viewed_at is not None and (delta[2] is None or viewed_at > delta[2]):
+        delta[2] = viewed_at
@@ -0,0 +1,395 @@
+import atexit
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Deque, Dict, List, Set, Tuple
+
+VIEW = 1
+LIKE = 2
+
+# (timestamp, count, kind, video name, tag)
+Event = Tuple[float, int, int, str, str]
+# key -> (views, likes), possibly decayed
+Counts = Dict[str, Tuple[float, float]]
+
+_MAGIC = b"BSEV"
+_VERSION = 1
+# magic, version, number of source segment names that follow (compacted segments only)
+_FILE_HEADER = struct.Struct("<4sBH")
+_NAME_LENGTH = struct.Struct("<H")
+# crc32 of everything after it, timestamp, count, kind, name length, tag length; then name and tag in UTF-8
+_RECORD = struct.Struct("<IdIBHH")
+_SUFFIX = ".seg"
+
+
+def _encode(ts: float, count: int, kind: int, name: str, tag: str) -> bytes:
+    name_bytes = name.encode()
+    tag_bytes = tag.encode()
+    body = _RECORD.pack(0, ts, count, kind, len(name_bytes), len(tag_bytes))[4:] + name_bytes + tag_bytes
+    return struct.pack("<I", zlib.crc32(body)) + body
+
+
+def _file_header(sources: List[str]) -> bytes:
+    parts = [_FILE_HEADER.pack(_MAGIC, _VERSION, len(sources))]
+    for source in sources:
+        encoded = source.encode()
+        parts.append(_NAME_LENGTH.pack(len(encoded)) + encoded)
+    return b"".join(parts)
+
+
+def _parse_header(data: bytes) -> Tuple[int, List[str]] | None:
+    """(header length, source segment names), or None if the header is not fully written yet."""
+    if len(data) < _FILE_HEADER.size:
+        return None
+    magic, version, count = _FILE_HEADER.unpack_from(data)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError("not an event log segment")
+    pos = _FILE_HEADER.size
+    sources = []
+    for _ in range(count):
+        if pos + _NAME_LENGTH.size > len(data):
+            return None
+        (length,) = _NAME_LENGTH.unpack_from(data, pos)
+        pos += _NAME_LENGTH.size
+        if pos + length > len(data):
+            return None
+        sources.append(data[pos:pos + length].decode())
+        pos += length
+    return pos, sources
+
+
+def _parse_records(data: bytes, pos: int) -> Tuple[List[Event], int, bool]:
+    """Decode complete records from pos: (events, end of the last good record, whether a bad one followed)."""
+    events: List[Event] = []
+    while pos + _RECORD.size <= len(data):
+        crc, ts, count, kind, name_length, tag_length = _RECORD.unpack_from(data, pos)
+        name_start = pos + _RECORD.size
+        end = name_start + name_length + tag_length
+        if end > len(data):
+            break
+        if zlib.crc32(data[pos + 4:end]) != crc:
+            return events, pos, True
+        events.append((ts, count, kind, data[name_start:name_start + name_length].decode(),
+                       data[name_start + name_length:end].decode()))
+        pos = end
+    return events, pos, False
+
+
+class EventLog:
+    """Append-only log of video view/like events with trending aggregates.
+
+    append() only puts the event on an in-memory deque. A background thread
+    drains it every flush_interval, writes the batch to this process's
+    current segment file with one write() and fsyncs at most every
+    fsync_interval, so a crash loses at most that much. The same thread then
+    folds every segment in the directory, other workers' included, into
+    per-bucket counts by video and by tag, plus running counts decayed with
+    half_life; video_counts() and tag_counts() answer from those. Segments
+    idle for compact_after seconds are merged into one segment of
+    per-bucket totals, and events older than retention are dropped.
+    """
+
+    def __init__(self, directory: str, flush_interval: float = 0.5, fsync_interval: float = 5.0,
+                 bucket_seconds: float = 60.0, half_life: float = 6 * 3600.0, retention: float = 7 * 86400.0,
+                 segment_bytes: int = 4 << 20, segment_seconds: float = 600.0, compact_after: float = 3600.0):
+        if compact_after <= segment_seconds:
+            raise ValueError("compact_after must be longer than segment_seconds")
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.bucket_seconds = bucket_seconds
+        self.half_life = half_life
+        self.retention = retention
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.compact_after = compact_after
+        os.makedirs(directory, exist_ok=True)
+
+        self._queue: Deque[Tuple[float, int, str, str]] = deque()
+        # Writer state, owned by whoever holds _io_lock
+        self._fd: int | None = None
+        self._segment: str | None = None
+        self._segment_size = 0
+        self._segment_opened = 0.0
+        self._last_fsync = 0.0
+        self._unsynced = False
+        self._next_compaction = 0.0
+        # Segment name -> bytes folded so far
+        self._offsets: Dict[str, int] = {}
+        # Segments never to fold: unreadable ones, and sources of a folded compacted segment
+        self._skipped: Set[str] = set()
+        self._io_lock = threading.Lock()
+
+        # bucket number -> (counts by video, counts by tag), each key -> [views, likes]
+        self._buckets: Dict[int, Tuple[Dict[str, List[int]], Dict[str, List[int]]]] = {}
+        # Forward-decayed [views, likes] relative to _decay_origin: value now = stored * 2 ** -((now - origin) / half_life)
+        self._decayed: Tuple[Dict[str, List[float]], Dict[str, List[float]]] = ({}, {})
+        self._decay_origin = time.time()
+        self._lock = threading.Lock()
+
+        self._pid = None
+        self._stop = threading.Event()
+        self._thread = None
+        atexit.register(self.close)
+
+    def _start(self):
+        # Threads and file descriptors do not survive fork(), so set up lazily per process
+        with self._io_lock:
+            if self._pid == os.getpid():
+                return
+            # A forked child must not write its parent's queued events a second time
+            self._queue.clear()
+            self._fd = None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def append(self, kind: int, name: str, tag: str, at: float | None = None):
+        if self._pid != os.getpid():
+            self._start()
+        self._queue.append((time.time() if at is None else at, kind, name, tag))
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush(sync=False)
+            except Exception as e:
+                # Keep the thread alive; queued events are retried on the next flush
+                print("Event log flush failed:", e)
+
+    def flush(self, sync: bool = True):
+        """Write queued events, fold new records from every segment and compact if due."""
+        now = time.time()
+        with self._io_lock:
+            batch = [self._queue.popleft() for _ in range(len(self._queue))]
+            if batch:
+                self._write(b"".join(_encode(ts, 1, kind, name, tag) for ts, kind, name, tag in batch), now)
+            if self._unsynced and (sync or now - self._last_fsync >= self.fsync_interval):
+                os.fsync(self._fd)
+                self._unsynced = False
+                self._last_fsync = now
+            self._fold(now)
+            if now >= self._next_compaction:
+                self._next_compaction = now + self.segment_seconds
+                self._compact(now)
+
+    def _write(self, data: bytes, now: float):
+        if self._fd is not None and (self._segment_size >= self.segment_bytes
+                                     or now - self._segment_opened >= self.segment_seconds):
+            os.fsync(self._fd)
+            os.close(self._fd)
+            self._fd = None
+        if self._fd is None:
+            self._segment = f"events-{time.time_ns():016x}-{os.getpid()}{_SUFFIX}"
+            self._fd = os.open(os.path.join(self.directory, self._segment),
+                               os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0), 0o644)
+            header = _file_header([])
+            os.write(self._fd, header)
+            self._segment_size = len(header)
+            self._segment_opened = now
+        os.write(self._fd, data)
+        self._segment_size += len(data)
+        self._unsynced = True
+
+    def _segments(self) -> List[os.DirEntry]:
+        return sorted((entry for entry in os.scandir(self.directory)
+                       if entry.name.endswith(_SUFFIX) and not entry.name.startswith(".")),
+                      key=lambda entry: entry.name)
+
+    def _fold(self, now: float):
+        present = set()
+        for entry in self._segments():
+            present.add(entry.name)
+            if entry.name in self._skipped:
+                continue
+            try:
+                self._fold_segment(entry, now)
+            except ValueError as e:
+                # e.g. a stray file with the segment suffix (UnicodeDecodeError is a ValueError too)
+                print(f"Skipping unreadable event segment {entry.name}: {e}")
+                self._skipped.add(entry.name)
+        for name in list(self._offsets):
+            if name not in present:
+                del self._offsets[name]
+        self._skipped &= present
+        self._expire(now)
+
+    def _fold_segment(self, entry: os.DirEntry, now: float):
+        offset = self._offsets.get(entry.name, 0)
+        try:
+            with open(entry.path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            # Compacted away by another worker since the directory was listed
+            return
+        pos = 0
+        if offset == 0:
+            header = _parse_header(data)
+            if header is None:
+                return
+            pos, sources = header
+            # A compacted segment repeats its sources; skip it if they were folded already.
+            # Sources are idle for compact_after before they are merged, so a worker that
+            # has seen one of them has seen all of them
+            if any(source in self._offsets or source in self._skipped for source in sources):
+                self._offsets[entry.name] = len(data)
+                return
+            # Otherwise skip the sources: they are unlinked only after this segment is
+            # published, so they may still be listed later in this scan or the next
+            self._skipped.update(sources)
+        events, pos, torn = _parse_records(data, pos)
+        if torn and entry.stat().st_mtime < now - self.compact_after:
+            # A writer died mid-record long ago; nothing valid can follow
+            print(f"Skipping torn tail of event segment {entry.name} at byte {offset + pos}")
+            pos = len(data)
+        self._offsets[entry.name] = offset + pos
+        self._apply(events, now)
+
+    def _apply(self, events: List[Event], now: float):
+        if not events:
+            return
+        oldest = now - self.retention
+        with self._lock:
+            for ts, count, kind, name, tag in events:
+                if ts < oldest:
+                    continue
+                column = 0 if kind == VIEW else 1
+                by_video, by_tag = self._buckets.setdefault(int(ts // self.bucket_seconds), ({}, {}))
+                weight = count * 2.0 ** ((ts - self._decay_origin) / self.half_life)
+                for counts, decayed, key in ((by_video, self._decayed[0], name), (by_tag, self._decayed[1], tag)):
+                    counts.setdefault(key, [0, 0])[column] += count
+                    decayed.setdefault(key, [0.0, 0.0])[column] += weight
+
+    def _expire(self, now: float):
+        first = int((now - self.retention) // self.bucket_seconds)
+        with self._lock:
+            for bucket in [bucket for bucket in self._buckets if bucket < first]:
+                del self._buckets[bucket]
+            # Rebase the decayed sums before 2 ** (age / half_life) gets large
+            if now - self._decay_origin > 32 * self.half_life:
+                scale = 2.0 ** (-(now - self._decay_origin) / self.half_life)
+                for decayed in self._decayed:
+                    for key in list(decayed):
+                        views, likes = decayed[key]
+                        if views * scale < 1e-9 and likes * scale < 1e-9:
+                            del decayed[key]
+                        else:
+                            decayed[key] = [views * scale, likes * scale]
+                self._decay_origin = now
+
+    def _compact(self, now: float):
+        cutoff = now - self.compact_after
+        try:
+            candidates = [entry for entry in self._segments()
+                          if entry.name != self._segment and entry.name not in self._skipped
+                          and entry.stat().st_mtime < cutoff]
+        except FileNotFoundError:
+            # Another worker is compacting right now
+            return
+        if len(candidates) < 2:
+            return
+        # One compaction at a time across workers; a lock left behind by a crash goes stale
+        lock_path = os.path.join(self.directory, ".compacting")
+        try:
+            lock = os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+        except FileExistsError:
+            if os.stat(lock_path).st_mtime < cutoff:
+                os.unlink(lock_path)
+            return
+        os.close(lock)
+        try:
+            totals: Dict[Tuple[int, int, str, str], int] = {}
+            oldest = now - self.retention
+            merged = []
+            for entry in candidates:
+                with open(entry.path, "rb") as f:
+                    data = f.read()
+                try:
+                    header = _parse_header(data)
+                    if header is None:
+                        continue
+                    events, _, _ = _parse_records(data, header[0])
+                except ValueError as e:
+                    # Left in place, like _fold leaves it unread
+                    print(f"Not compacting unreadable event segment {entry.name}: {e}")
+                    continue
+                merged.append(entry)
+                for ts, count, kind, name, tag in events:
+                    if ts >= oldest:
+                        key = (int(ts // self.bucket_seconds), kind, name, tag)
+                        totals[key] = totals.get(key, 0) + count
+            if len(merged) < 2:
+                return
+            sources = [entry.name for entry in merged]
+            name = f"compacted-{time.time_ns():016x}-{os.getpid()}{_SUFFIX}"
+            tmp = os.path.join(self.directory, "." + name)
+            with open(tmp, "wb") as f:
+                f.write(_file_header(sources))
+                f.write(b"".join(_encode(bucket * self.bucket_seconds, count, kind, video, tag)
+                                 for (bucket, kind, video, tag), count in totals.items()))
+                f.flush()
+                os.fsync(f.fileno())
+            # Publish the merged segment before removing its sources so readers never miss both
+            os.replace(tmp, os.path.join(self.directory, name))
+            for entry in merged:
+                os.unlink(entry.path)
+        finally:
+            os.unlink(lock_path)
+
+    def video_counts(self, window: float | None = None, half_life: float | None = None,
+                     now: float | None = None) -> Counts:
+        """(views, likes) per video over the last `window` seconds, weighted by 2 ** -(age / half_life).
+
+        Without a window, counts cover the whole retention period; without a
+        half_life they are plain sums. With neither, the log's own half_life
+        applies. Counts are as of the last flush.
+        """
+        return self._counts(0, window, half_life, now)
+
+    def tag_counts(self, window: float | None = None, half_life: float | None = None,
+                   now: float | None = None) -> Counts:
+        """Like video_counts(), by tag."""
+        return self._counts(1, window, half_life, now)
+
+    def _counts(self, which: int, window: float | None, half_life: float | None, now: float | None) -> Counts:
+        now = time.time() if now is None else now
+        with self._lock:
+            if window is None and (half_life is None or half_life == self.half_life):
+                # O(keys) from the running sums
+                scale = 2.0 ** (-(now - self._decay_origin) / self.half_life)
+                return {key: (views * scale, likes * scale) for key, (views, likes) in self._decayed[which].items()}
+            start = now - window if window is not None else float("-inf")
+            totals: Dict[str, List[float]] = {}
+            for bucket, counts in self._buckets.items():
+                bucket_start = bucket * self.bucket_seconds
+                if bucket_start + self.bucket_seconds <= start:
+                    continue
+                weight = 1.0
+                if half_life is not None:
+                    age = max(now - (bucket_start + self.bucket_seconds / 2), 0.0)
+                    weight = 2.0 ** (-age / half_life)
+                for key, (views, likes) in counts[which].items():
+                    total = totals.setdefault(key, [0.0, 0.0])
+                    total[0] += views * weight
+                    total[1] += likes * weight
+        return {key: (views, likes) for key, (views, likes) in totals.items()}
+
+    def close(self):
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self.flush()
+        finally:
+            with self._io_lock:
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+            self._pid = None
@@ -0,0 +1,222 @@
+import argparse
+import io
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Iterator, List, Tuple
+
+# Boxes on the path from moov down to the chunk offset tables (stco/co64)
+_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+_COPY_CHUNK = 1 << 20
+
+
+class Mp4Error(ValueError):
+    pass
+
+
+class _Overflow(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Box:
+    type: str
+    offset: int
+    header_size: int
+    size: int
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.size
+
+
+def iter_boxes(f: BinaryIO, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """Yield (type, payload offset, box end) for the ISO BMFF boxes between start and end."""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header)
+        payload = offset + 8
+        if size == 1:
+            largesize = f.read(8)
+            if len(largesize) < 8:
+                return
+            size = struct.unpack(">Q", largesize)[0]
+            payload += 8
+        elif size == 0:
+            size = end - offset
+        if size < payload - offset:
+            return
+        yield box_type, payload, offset + size
+        offset += size
+
+
+def top_level_boxes(f: BinaryIO, size: int) -> List[Box]:
+    """The file's top-level boxes; raises Mp4Error unless they cover it exactly."""
+    boxes = []
+    end = 0
+    for box_type, payload, box_end in iter_boxes(f, 0, size):
+        if box_end > size:
+            raise Mp4Error(f"{box_type.decode('latin-1')} box at {end} runs past the end of the file")
+        boxes.append(Box(box_type.decode("latin-1"), end, payload - end, box_end - end))
+        end = box_end
+    if end != size or not boxes:
+        raise Mp4Error(f"not an MP4 file, or truncated at byte {end}")
+    return boxes
+
+
+def box_layout(path: str) -> Tuple[Box, ...]:
+    with open(path, "rb") as f:
+        return tuple(top_level_boxes(f, os.fstat(f.fileno()).st_size))
+
+
+def is_faststart(boxes: List[Box] | Tuple[Box, ...]) -> bool:
+    """True if moov comes before the first mdat (or there is nothing to move)."""
+    types = [box.type for box in boxes]
+    if "moov" not in types or "mdat" not in types:
+        return True
+    return types.index("moov") < types.index("mdat")
+
+
+def _header(box_type: bytes, payload_size: int) -> bytes:
+    if payload_size + 8 <= 0xFFFFFFFF:
+        return struct.pack(">I4s", payload_size + 8, box_type)
+    return struct.pack(">I4sQ", 1, box_type, payload_size + 16)
+
+
+def _relocate_chunks(box_type: bytes, body: bytes, relocate: Callable[[int], int], co64: bool) -> Tuple[bytes, bytes]:
+    count = struct.unpack_from(">I", body, 4)[0]
+    width = "I" if box_type == b"stco" else "Q"
+    offsets = [relocate(offset) for offset in struct.unpack_from(f">{count}{width}", body, 8)]
+    if box_type == b"stco" and not co64:
+        if offsets and max(offsets) > 0xFFFFFFFF:
+            raise _Overflow()
+        return b"stco", body[:8] + struct.pack(f">{count}I", *offsets)
+    return b"co64", body[:8] + struct.pack(f">{count}Q", *offsets)
+
+
+def _rebuild(moov: bytes, start: int, end: int, relocate: Callable[[int], int], co64: bool) -> bytes:
+    out = bytearray()
+    f = io.BytesIO(moov)
+    for box_type, payload, box_end in iter_boxes(f, start, end):
+        if box_type == b"cmov":
+            raise Mp4Error("compressed moov boxes are not supported")
+        if box_type in _CONTAINERS:
+            body = _rebuild(moov, payload, box_end, relocate, co64)
+        elif box_type in (b"stco", b"co64"):
+            box_type, body = _relocate_chunks(box_type, moov[payload:box_end], relocate, co64)
+        else:
+            body = moov[payload:box_end]
+        out += _header(box_type, len(body)) + body
+    return bytes(out)
+
+
+def _copy(view: memoryview, start: int, end: int, out: BinaryIO):
+    for offset in range(start, end, _COPY_CHUNK):
+        out.write(view[offset:min(offset + _COPY_CHUNK, end)])
+
+
+def faststart(path: str, output: str | None = None) -> bool:
+    """Rewrite an MP4 so its moov box comes before mdat.
+
+    The moov is rebuilt with every chunk offset (stco/co64) shifted by the
+    bytes that now precede the media data; stco tables become co64 if a
+    shifted offset no longer fits in 32 bits. The media data is streamed
+    from a memory map into a temporary file which then replaces output
+    (default: path itself), so readers never see a partly written file.
+    Returns False, writing nothing, if the file already plays from the start.
+    """
+    output = output or path
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < 8:
+            raise Mp4Error(f"{path} is too small to be an MP4 file")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            boxes = top_level_boxes(mm, size)
+            if is_faststart(boxes):
+                return False
+            moov_box = next(box for box in boxes if box.type == "moov")
+            insert_at = next(box for box in boxes if box.type == "mdat").offset
+            moov = mm[moov_box.offset:moov_box.end]
+
+            # Data between the insertion point and the old moov moves forward by the
+            # new moov's size; data after the old moov moves by the size difference
+            co64 = False
+            delta = moov_box.size
+            while True:
+                def relocate(offset: int, delta: int = delta) -> int:
+                    if insert_at <= offset < moov_box.offset:
+                        return offset + delta
+                    if offset >= moov_box.end:
+                        return offset + delta - moov_box.size
+                    return offset
+                try:
+                    new_moov = _rebuild(moov, 0, len(moov), relocate, co64)
+                except _Overflow:
+                    co64 = True
+                    continue
+                if len(new_moov) == delta:
+                    break
+                delta = len(new_moov)
+
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output)),
+                                       prefix=".", suffix=".faststart")
+            try:
+                with os.fdopen(fd, "wb") as out, memoryview(mm) as view:
+                    _copy(view, 0, insert_at, out)
+                    out.write(new_moov)
+                    _copy(view, insert_at, moov_box.offset, out)
+                    _copy(view, moov_box.end, size, out)
+                    out.flush()
+                    os.fsync(out.fileno())
+                shutil.copymode(path, tmp)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+    # Replace only after the map is closed; Windows refuses to replace a mapped file
+    try:
+        os.replace(tmp, output)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return True
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python Website/mp4_faststart.py",
+                                     description="Move the moov box of MP4 files ahead of mdat so playback can start early.")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--check", action="store_true", help="only report files that need rewriting; exit 1 if any do")
+    parser.add_argument("-o", "--output", help="write to this file instead of in place (single input only)")
+    args = parser.parse_args(argv)
+    if args.output and len(args.paths) > 1:
+        parser.error("--output takes a single input file")
+
+    status = 0
+    for path in args.paths:
+        try:
+            if args.check:
+                boxes = box_layout(path)
+                if not is_faststart(boxes):
+                    status = 1
+                print(f"{path}: {'ok' if is_faststart(boxes) else 'needs faststart'} "
+                      f"({' '.join(box.type for box in boxes)})")
+            elif faststart(path, args.output):
+                print(f"{path}: moved moov ahead of mdat")
+            else:
+                print(f"{path}: already faststart")
+        except (OSError, Mp4Error, struct.error) as e:
+            print(f"{path}: {e}", file=sys.stderr)
+            status = 2
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Tuple
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack at a fixed interval from a helper thread.
+
+    The profiled code runs unmodified; the cost is one sys._current_frames()
+    call per interval. Stacks are aggregated as "outer;...;inner" keys so
+    collapsed() can be fed straight to flamegraph.pl or speedscope.
+    """
+
+    def __init__(self, thread_id: int | None = None, interval: float = 0.005, max_depth: int = 64):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "SamplingProfiler":
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, n: int = 10) -> List[Tuple[str, int]]:
+        """Innermost frames by sample count: where the thread was actually spending time."""
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(n)
+
+
+class ProfileLog:
+    """The most recent captured request profiles, oldest dropped first."""
+
+    def __init__(self, maxlen: int = 50):
+        self._profiles: Deque[Dict[str, Any]] = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def add(self, method: str, path: str, status: int, duration: float, profiler: SamplingProfiler):
+        with self._lock:
+            self._profiles.append({
+                "method": method,
+                "path": path,
+                "status": status,
+                "duration": duration,
+                "captured_at": time.time(),
+                "samples": profiler.samples,
+                "top_functions": profiler.top_functions(),
+                "collapsed": profiler.collapsed(),
+            })
+
+    def recent(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(reversed(self._profiles))
+
+    def render(self) -> str:
+        sections = []
+        for profile in self.recent():
+            header = (f"# {profile['method']} {profile['path']} -> {profile['status']} "
+                      f"in {profile['duration'] * 1000:.1f} ms, {profile['samples']} samples, "
+                      f"captured {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(profile['captured_at']))}")
+            sections.append(header + "\n" + profile["collapsed"])
+        return "\n\n".join(sections) + "\n"
+
+
+slow_requests = ProfileLog()
@@ -0,0 +1,92 @@
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from llm.embeddings import VectorIndex
+from .catalog import VideoCatalog
+
+
+@dataclass
+class RankingWeights:
+    relevance: float = 0.6
+    popularity: float = 0.3
+    recency: float = 0.1
+    # One like counts as this many views in the popularity signal
+    like_weight: float = 3.0
+    recency_half_life_hours: float = 72.0
+
+
+class LocalRanker:
+    """Deterministic video ranking computed locally with NumPy.
+
+    score = relevance * cosine(preference, video text)
+          + popularity * log1p(views + like_weight * likes), scaled to [0, 1]
+          + recency * 0.5 ** (hours since last view / half life)
+
+    `activity` replaces the all-time views and likes in the popularity term,
+    e.g. with recent counts from an EventLog so trending videos rank higher.
+    """
+
+    def __init__(self, catalog: VideoCatalog, index: VectorIndex, weights: RankingWeights | None = None):
+        self.catalog = catalog
+        self.index = index
+        self.weights = weights or RankingWeights()
+        self._index_keys = None
+        self._index_slots = np.zeros(0, dtype=np.int64)
+
+    def scores(self, user_preference: str, now: float | None = None,
+               activity: Dict[str, Tuple[float, float]] | None = None) -> np.ndarray:
+        # Similarities first: add_video fills the catalog before the index, so
+        # every indexed name already has a slot in the counter snapshot
+        keys, similarities = self.index.similarities(user_preference)
+        views, likes, last_viewed = self.catalog.counter_arrays()
+        weights = self.weights
+        if activity is not None:
+            views, likes = self._activity_arrays(activity, len(views))
+
+        relevance = np.zeros(len(views))
+        if keys:
+            relevance[self._slots_for(keys)] = similarities
+
+        popularity = np.log1p(views + weights.like_weight * likes)
+        peak = popularity.max(initial=0.0)
+        if peak > 0:
+            popularity /= peak
+
+        age_hours = ((now if now is not None else time.time()) - last_viewed) / 3600.0
+        recency = np.exp2(-np.maximum(age_hours, 0.0) / weights.recency_half_life_hours)
+        recency[np.isnan(recency)] = 0.0
+
+        return weights.relevance * relevance + weights.popularity * popularity + weights.recency * recency
+
+    def _activity_arrays(self, activity: Dict[str, Tuple[float, float]], n: int) -> Tuple[np.ndarray, np.ndarray]:
+        views = np.zeros(n)
+        likes = np.zeros(n)
+        for name, (recent_views, recent_likes) in activity.items():
+            slot = self.catalog.slot(name)
+            # Videos added after the counter snapshot are left out until the next call
+            if slot is not None and slot < n:
+                views[slot] = recent_views
+                likes[slot] = recent_likes
+        return views, likes
+
+    def _slots_for(self, keys: List[str]) -> np.ndarray:
+        # The index hands out a new key list whenever it rebuilds, so cache the mapping per list
+        if keys is not self._index_keys:
+            self._index_slots = np.fromiter((self.catalog.slot(name) for name in keys), dtype=np.int64,
+                                            count=len(keys))
+            self._index_keys = keys
+        return self._index_slots
+
+    def rank(self, user_preference: str, k: int, now: float | None = None,
+             activity: Dict[str, Tuple[float, float]] | None = None) -> List[Dict[str, Any]]:
+        scores = self.scores(user_preference, now, activity)
+        if k <= 0 or not len(scores):
+            return []
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        videos = self.catalog.videos
+        return [{"name": videos[slot].name, "tag": videos[slot].tag} for slot in top]
@@ -1,20 +1,46 @@
-from dotenv import load_dotenv
-import google.generativeai as genai
-import os
-from typing import List, Dict, Any
-import json
+from typing import List, Dict, Any, Tuple
+import heapq
+import time
+from datetime import datetime
+from llm.cache import ResponseCache
+from llm.client import ModelRegistry, get_default_registry
+from llm.embeddings import Embedder, VectorIndex
+from llm.metrics import instrumented
+from llm.parsing import VIDEO_PATH_ITEM, StructuredOutputError
 from .Video import Video
+from .catalog import VideoCatalog
+from .counters import CounterStore
+from .event_log import LIKE, VIEW, EventLog
+from .ranking import LocalRanker, RankingWeights
+
+RANKING_MODES = ("local", "rerank", "llm")
 class LLMEnhancedRecommendationSystem:
-    def __init__(self):
-        load_dotenv()
-        google_api_key = os.getenv('GOOGLE_API_KEY')
-        if not google_api_key:
-            raise ValueError("GOOGLE_API_KEY not found in environment variables")
-        genai.configure(api_key=google_api_key)
-        self.videos: List[Video] = []
+    def __init__(self, response_cache: ResponseCache | None = None, model_registry: ModelRegistry | None = None,
+                 embedder: Embedder | None = None, prompt_top_k: int = 20,
+                 counter_store: CounterStore | None = None, ranking_mode: str = "rerank",
+                 ranking_weights: RankingWeights | None = None, event_log: EventLog | None = None):
+        self.response_cache = response_cache
+        self.model_registry = model_registry or get_default_registry()
+        self.video_index = VectorIndex(embedder)
+        self.prompt_top_k = prompt_top_k
+        self.catalog = VideoCatalog()
+        self.ranker = LocalRanker(self.catalog, self.video_index, ranking_weights)
+        self.ranking_mode = ranking_mode
+        # Optional host-wide view/like counters shared between worker processes
+        self.counter_store = counter_store
+        self.counter_sync_interval = 1.0
+        self._counters_synced_at = 0.0
+        self._next_counter_sync = 0.0
+        # Optional log of timestamped views/likes behind the window=/half_life= trending options
+        self.event_log = event_log
         self.add_sample_videos()
+        self.sync_counters()
+    @property
+    def videos(self) -> List[Video]:
+        return self.catalog.videos
     def add_video(self, video: Video):
-        self.videos.append(video)
+        self.catalog.add(video)
+        self.video_index.add(video.name, f"{video.name} {video.tag}")
     def add_sample_videos(self):
         sample_videos = [
             Video("Introduction to Python", "Programming"),
@@ -27,50 +53,128 @@ class LLMEnhancedRecommendationSystem:
             Video("invideo-ai-480 Unlock the Power of Pandas in Python! 2024-09-14", "Pandas"),
             Video("invideo-ai-720 How Netflix Knows What You Want to Watch 2024-09-14", "Neflix"),
         ]
-        self.videos.extend(sample_videos)
+        for video in sample_videos:
+            self.add_video(video)
     def like_video(self, video_name: str):
-        video = self.get_video_by_name(video_name)
-        if video:
-            video.add_like()
-        else:
+        video = self.catalog.record_like(video_name)
+        if not video:
             print(f"Video '{video_name}' not found")
+            return
+        if self.counter_store is not None:
+            self.counter_store.increment(video_name, likes=1)
+        if self.event_log is not None:
+            self.event_log.append(LIKE, video_name, video.tag)
     def view_video(self, video_name: str):
-        video = self.get_video_by_name(video_name)
-        if video:
-            video.view()
-        else:
+        video = self.catalog.record_view(video_name)
+        if not video:
             print(f"Video '{video_name}' not found")
+            return
+        viewed_at = video.last_viewed.timestamp()
+        if self.counter_store is not None:
+            self.counter_store.increment(video_name, views=1, viewed_at=viewed_at)
+        if self.event_log is not None:
+            self.event_log.append(VIEW, video_name, video.tag, viewed_at)
+    def sync_counters(self, force: bool = False):
+        """Pull counts recorded by other workers into the local catalog."""
+        if self.counter_store is None or (not force and time.monotonic() < self._next_counter_sync):
+            return
+        self._next_counter_sync = time.monotonic() + self.counter_sync_interval
+        totals, self._counters_synced_at = self.counter_store.changes_since(self._counters_synced_at)
+        for name, (views, likes, last_viewed) in totals.items():
+            self.catalog.apply_counts(name, views, likes,
+                                      datetime.fromtimestamp(last_viewed) if last_viewed else None)
+    def _trending(self) -> EventLog:
+        if self.event_log is None:
+            raise ValueError("window= and half_life= need the recommender to have an event_log")
+        return self.event_log
+    def _activity(self, window: float | None, half_life: float | None) -> Dict[str, Tuple[float, float]] | None:
+        if window is None and half_life is None:
+            return None
+        return self._trending().video_counts(window=window, half_life=half_life)
     def get_video_by_name(self, video_name: str) -> Video | None:
-        return next((video for video in self.videos if video.name == video_name), None)
-    def generate_learning_path(self, user_preference: str) -> List[Dict[str, Any]]:
+        return self.catalog.get(video_name)
+    @instrumented("recommender.generate_learning_path")
+    def generate_learning_path(self, user_preference: str, use_cache: bool = True, refresh: bool = False,
+                               ranking_mode: str | None = None, max_items: int = 10,
+                               window: float | None = None, half_life: float | None = None) -> List[Dict[str, Any]]:
+        """Rank videos for a preference as a list of {"name", "tag"} dicts.
+
+        ranking_mode is "local" (LocalRanker only), "rerank" (the LLM reorders
+        the local top prompt_top_k) or "llm" (the LLM ranks the catalog
+        pre-filtered by similarity). The LLM modes fall back to the local
+        ranking when the call fails or its output does not match the schema;
+        otherwise names that are not candidates are dropped and the local
+        ranking fills the path up to max_items.
+        window/half_life (seconds) base the popularity signal on recent
+        activity from the event log instead of all-time counts.
+        """
+        # Same preference, same prompt: lets identical concurrent requests share one call and cache entry
+        user_preference = " ".join(user_preference.split()).casefold()
+        mode = ranking_mode or self.ranking_mode
+        if mode not in RANKING_MODES:
+            raise ValueError(f"ranking_mode must be one of {RANKING_MODES}, got {mode!r}")
+        self.sync_counters()
+        activity = self._activity(window, half_life)
+        if mode == "local":
+            return self.ranker.rank(user_preference, max_items, activity=activity)
+
+        if mode == "rerank":
+            candidates = [self.get_video_by_name(item["name"])
+                          for item in self.ranker.rank(user_preference, self.prompt_top_k, activity=activity)]
+        else:
+            candidates = self._candidate_videos(user_preference)
         prompt = f"""
         Based on the user's preference '{user_preference}' ,
         generate a personalized learning path using the following available content:
-        {self.videos}
+        {candidates}
         Consider the following factors when recommending videos:
         1. Relevance to the user's preference
         2. Number of likes and views
         3. How recently the video was last viewed
         Format the response as a JSON array, containing a ranked list of video names, their tags.
+        Each element must be an object with the keys "name" and "tag".
         The total duration should not exceed the available time.
         """
-        model = genai.GenerativeModel("gemini-1.5-pro")
-        response = model.generate_content(prompt)
-        raw_text = response.text
-        learning_path_str = raw_text.replace("```json", "").replace("```", "").strip()
         try:
-            learning_path = json.loads(learning_path_str)
-            return learning_path
-        except json.JSONDecodeError:
-            print("Error decoding JSON. Raw response:", raw_text)
-            return []
+            items = self.model_registry.generate_items("gemini-1.5-pro", None, prompt, VIDEO_PATH_ITEM,
+                                                       self.response_cache, use_cache=use_cache, refresh=refresh)
+        except StructuredOutputError as exc:
+            print("Invalid LLM ranking, using local ranking:", exc)
+        except Exception as exc:
+            print("LLM ranking failed, using local ranking:", exc)
+        else:
+            return self._checked_path(items, candidates, user_preference, max_items, activity)
+        return self.ranker.rank(user_preference, max_items, activity=activity)
+    def _checked_path(self, items: List[Dict[str, Any]], candidates: List[Video], user_preference: str,
+                      max_items: int, activity: Dict[str, Tuple[float, float]] | None) -> List[Dict[str, str]]:
+        # The model may invent, repeat or drop videos: keep each candidate it names once,
+        # with the catalog's tag, and fill the rest from the local ranking
+        tags = {video.name: video.tag for video in candidates if video is not None}
+        path = []
+        for item in items:
+            name = item["name"]
+            if name in tags:
+                path.append({"name": name, "tag": tags.pop(name)})
+        if len(path) < max_items:
+            named = {item["name"] for item in path}
+            path.extend(item for item in self.ranker.rank(user_preference, max_items + len(path), activity=activity)
+                        if item["name"] not in named)
+        return path[:max_items]
+    def _candidate_videos(self, user_preference: str) -> List[Video]:
+        if len(self.catalog) <= self.prompt_top_k:
+            return self.videos
+        names = [name for name, _ in self.video_index.top_k(user_preference, self.prompt_top_k)]
+        return [self.get_video_by_name(name) for name in names]
     def get_video_stats(self) -> Dict[str, Dict[str, int]]:
-        return {video.name: {"likes": video.likes, "views": video.views} for video in self.videos}
-    def get_popular_tags(self, n: int = 3) -> List[str]:
-        tag_counts = {}
-        for video in self.videos:
-            tag_counts[video.tag] = tag_counts.get(video.tag, 0) + video.views
-        return sorted(tag_counts, key=tag_counts.get, reverse=True)[:n]
+        self.sync_counters()
+        return self.catalog.video_stats()
+    def get_popular_tags(self, n: int = 3, window: float | None = None, half_life: float | None = None) -> List[str]:
+        """Tags by views: all time, or trending over window/half_life seconds of the event log."""
+        if window is None and half_life is None:
+            self.sync_counters()
+            return self.catalog.popular_tags(n)
+        counts = self._trending().tag_counts(window=window, half_life=half_life)
+        return heapq.nlargest(n, counts, key=lambda tag: counts[tag][0])
 if __name__ == "__main__":
     recommender = LLMEnhancedRecommendationSystem()
     # Simulate some user activity
@@ -1,7 +1,71 @@
-from flask import Blueprint, render_template
+import re
+import time
+from typing import Iterator
+from flask import Blueprint, Response, abort, current_app, g, render_template, request, send_file, stream_with_context
+from llm.metrics import CONTENT_TYPE, REGISTRY
+from . import get_quiz_platform, video_manifest
+from .profiling import SamplingProfiler, slow_requests
 
 routesPages = Blueprint("routes",__name__)
 
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_seconds", "Flask request latency per route, until the last byte for streamed responses.",
+    ("route", "method", "status"))
+
+
+def _profile_requested() -> bool:
+    config = current_app.config
+    if not config.get("PROFILER_ENABLED"):
+        return False
+    return config.get("PROFILE_ALL_REQUESTS") or request.args.get("profile") == "1"
+
+
+@routesPages.before_request
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.profiler = None
+    if _profile_requested():
+        g.profiler = SamplingProfiler(interval=current_app.config.get("PROFILER_INTERVAL", 0.005)).start()
+
+
+@routesPages.after_request
+def _finish_request(response):
+    started = g.pop("request_started", None)
+    if started is None:
+        return response
+    profiler = g.pop("profiler", None)
+    route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+    method, path, status = request.method, request.full_path.rstrip("?"), response.status_code
+    # Explicit ?profile=1 requests are always kept, sampled ones only when slow
+    keep_after = 0.0 if request.args.get("profile") == "1" else current_app.config.get("PROFILE_SLOW_SECONDS", 1.0)
+
+    def finish():
+        duration = time.perf_counter() - started
+        HTTP_REQUEST_SECONDS.observe(duration, route=route, method=method, status=status)
+        if profiler is not None:
+            profiler.stop()
+            if duration >= keep_after:
+                slow_requests.add(method, path, status, duration, profiler)
+
+    # A streamed body is produced after this hook, so time it until the response is closed
+    if response.is_streamed:
+        response.call_on_close(finish)
+    else:
+        finish()
+    return response
+
+
+@routesPages.route("/metrics")
+def metrics_page():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+@routesPages.route("/metrics/profiles")
+def profiles_page():
+    if not current_app.config.get("PROFILER_ENABLED"):
+        abort(404)
+    return Response(slow_requests.render(), mimetype="text/plain")
+
 @routesPages.route('/',methods=['GET', 'POST'])
 def index_page():
     return render_template("index.html")
@@ -19,35 +83,90 @@ def courses_page():
 def course2_page():
     return render_template("course.html")
 
+# Each carousel shows the videos in static/videos whose filename starts with its prefix
 @routesPages.route("/bVids")
 def bVids_page():
-    videos = ["bus1.mp4","bus2.mp4","bus3.mp4"]  # list of video files
-    return render_template("bVids.html", videos=videos)
-    # return render_template("bVids.html")
+    return render_template("bVids.html", videos=video_manifest.with_prefix("bus"))
 
 
 @routesPages.route("/pVids")
 def pVids_page():
-    videos = ["prog1.mp4", "prog2.mp4"]  # list of video files
-    return render_template("pVids.html", videos=videos)
-    # return render_template("bVids.html")
+    return render_template("pVids.html", videos=video_manifest.with_prefix("prog"))
 
 
 @routesPages.route("/phyVids")
 def phyVids_page():
-    videos = ["phy1.mp4", "phy2.mp4"]  # list of video files
-    return render_template("phyVids.html", videos=videos)
-    # return render_template("bVids.html")
+    return render_template("phyVids.html", videos=video_manifest.with_prefix("phy"))
 
 
 @routesPages.route("/jVids")
 def jVids_page():
-    videos = ["java1.mp4", "phy2.mp4"]  # list of video files
-    return render_template("jVids.html", videos=videos)
-    # return render_template("bVids.html")
+    return render_template("jVids.html", videos=video_manifest.with_prefix("java"))
 
 
 @routesPages.route("/snippets")
 def video_page():
-    videos = ["vid1.mp4","vid2.mp4","bus4.mp4","vid3.mp4"]  # list of video files
-    return render_template("snippets.html", videos=videos)
+    return render_template("snippets.html", videos=video_manifest.all())
+
+
+@routesPages.route("/videos/<name>")
+def serve_video(name):
+    video = video_manifest.get(name)
+    if video is None:
+        abort(404)
+    # conditional=True answers Range requests with 206 and If-None-Match with 304. Page links carry
+    # ?v=<etag>, so a changed file gets a new URL and a year-long max-age is safe for that URL only;
+    # any other URL must be revalidated or a stale copy would outlive the file
+    versioned = request.args.get("v") == video.etag
+    response = send_file(video.path, mimetype="video/mp4", conditional=True, etag=video.etag,
+                         last_modified=video.mtime, max_age=365 * 24 * 60 * 60 if versioned else None)
+    response.headers["Accept-Ranges"] = "bytes"
+    if versioned:
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+# Sent instead of the exception text, which can carry file paths and upstream API errors
+STREAM_ERROR_MESSAGE = "The response could not be completed. Please try again."
+
+
+def _server_sent_events(chunks: Iterator[str]) -> Iterator[str]:
+    try:
+        for chunk in chunks:
+            yield _data_fields(chunk) + "\n"
+    except Exception:
+        current_app.logger.exception("Event stream %s failed", request.path)
+        yield "event: error\n" + _data_fields(STREAM_ERROR_MESSAGE) + "\n"
+        return
+    yield "event: done\ndata: \n\n"
+
+
+# Server-sent events end a line at CRLF, CR or LF
+_LINE_BREAK = re.compile(r"\r\n|\r|\n")
+
+
+def _data_fields(text: str) -> str:
+    # A multi-line text becomes one data field per line; a raw line break would end the field early
+    return "".join(f"data: {line}\n" for line in _LINE_BREAK.split(text))
+
+
+def _event_stream(chunks: Iterator[str]) -> Response:
+    response = Response(stream_with_context(_server_sent_events(chunks)), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Stop reverse proxies from buffering the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@routesPages.route("/quiz/<user_id>/<quiz_id>/feedback/stream")
+def quiz_feedback_stream(user_id, quiz_id):
+    refresh = request.args.get("refresh") == "1"
+    return _event_stream(get_quiz_platform().stream_personalized_feedback(user_id, quiz_id, refresh=refresh))
+
+
+@routesPages.route("/quiz/<user_id>/next/stream")
+def next_quiz_stream(user_id):
+    refresh = request.args.get("refresh") == "1"
+    return _event_stream(get_quiz_platform().stream_next_quiz_recommendation(user_id, refresh=refresh))
@@ -0,0 +1,50 @@
+// Video carousels load only the active slide's video and the next one.
+// Every <video> is rendered with preload="none" and its URL in data-src; the URL is
+// attached when the slide becomes active or next, and videos that slide out of view are paused.
+(function () {
+  function attach(video) {
+    if (video && video.dataset.src && !video.getAttribute("src")) {
+      video.src = video.dataset.src;
+      video.preload = "auto";
+    }
+  }
+
+  function update(carousel) {
+    var items = carousel.querySelectorAll(".carousel-item");
+    if (!items.length) {
+      return;
+    }
+    var active = 0;
+    items.forEach(function (item, i) {
+      if (item.classList.contains("active")) {
+        active = i;
+      }
+    });
+    var current = items[active].querySelector("video.vid");
+    attach(current);
+    attach(items[(active + 1) % items.length].querySelector("video.vid"));
+
+    carousel.querySelectorAll("video.vid").forEach(function (video) {
+      if (video !== current && !video.paused) {
+        video.pause();
+      }
+    });
+    if (current && current.paused) {
+      // Browsers may refuse to autoplay with sound until the user interacts
+      var playing = current.play();
+      if (playing && playing.catch) {
+        playing.catch(function () {});
+      }
+    }
+  }
+
+  document.addEventListener("DOMContentLoaded", function () {
+    document.querySelectorAll(".carousel").forEach(function (carousel) {
+      update(carousel);
+      // Works with either Bootstrap version: react to the slide's "active" class changing
+      new MutationObserver(function () {
+        update(carousel);
+      }).observe(carousel, { subtree: true, attributes: true, attributeFilter: ["class"] });
+    });
+  });
+})();
@@ -0,0 +1,106 @@
+import os
+import struct
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .mp4_faststart import Box, Mp4Error, box_layout, faststart, is_faststart, iter_boxes
+
+
+@dataclass(frozen=True)
+class VideoFile:
+    name: str
+    path: str
+    size: int
+    mtime: float
+    # Seconds, from the movie header; None if the file has no readable mvhd box
+    duration: float | None
+    etag: str
+    # Top-level MP4 boxes in file order; empty if the file could not be parsed
+    boxes: Tuple[Box, ...] = ()
+
+    @property
+    def faststart(self) -> bool:
+        """Whether moov precedes mdat, i.e. playback can start before the whole file arrives."""
+        return bool(self.boxes) and is_faststart(self.boxes)
+
+
+def read_duration(path: str) -> Optional[float]:
+    """Movie duration in seconds from moov/mvhd, reading only box headers."""
+    with open(path, "rb") as f:
+        end = os.fstat(f.fileno()).st_size
+        for box_type, payload, box_end in iter_boxes(f, 0, end):
+            if box_type != b"moov":
+                continue
+            for child_type, child_payload, _ in iter_boxes(f, payload, box_end):
+                if child_type != b"mvhd":
+                    continue
+                f.seek(child_payload)
+                version = f.read(4)[0]
+                if version == 1:
+                    timescale, duration = struct.unpack(">IQ", f.read(28)[16:])
+                else:
+                    timescale, duration = struct.unpack(">II", f.read(16)[8:])
+                return duration / timescale if timescale else None
+    return None
+
+
+class VideoManifest:
+    """Index of the MP4s in one directory, built once by scanning it.
+
+    Routes look videos up here instead of hardcoding filenames, and the
+    ETag (from size and mtime) lets clients and proxies cache each file.
+    With optimize=True, files whose moov box trails the media data are
+    rewritten in place (see mp4_faststart) before they are indexed.
+    """
+
+    def __init__(self, directory: str, optimize: bool = False):
+        self.directory = directory
+        self.optimize = optimize
+        self._videos: Dict[str, VideoFile] = {}
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        videos = {}
+        if os.path.isdir(self.directory):
+            for entry in sorted(os.scandir(self.directory), key=lambda entry: entry.name):
+                if entry.is_file() and entry.name.lower().endswith(".mp4"):
+                    if self.optimize:
+                        self._faststart(entry.path)
+                    videos[entry.name] = self._describe(entry.name, entry.path, os.stat(entry.path))
+        with self._lock:
+            self._videos = videos
+
+    @staticmethod
+    def _faststart(path: str):
+        try:
+            if faststart(path):
+                print(f"Moved moov ahead of mdat in {path}")
+        except (OSError, Mp4Error, struct.error) as e:
+            print(f"Could not faststart {path}: {e}")
+
+    @staticmethod
+    def _describe(name: str, path: str, stat: os.stat_result) -> VideoFile:
+        try:
+            duration = read_duration(path)
+        except (OSError, struct.error, IndexError):
+            duration = None
+        try:
+            boxes = box_layout(path)
+        except (OSError, Mp4Error):
+            boxes = ()
+        return VideoFile(name=name, path=path, size=stat.st_size, mtime=stat.st_mtime, duration=duration,
+                         etag=f"{stat.st_size:x}-{stat.st_mtime_ns:x}", boxes=boxes)
+
+    def get(self, name: str) -> VideoFile | None:
+        return self._videos.get(name)
+
+    def all(self) -> List[VideoFile]:
+        return list(self._videos.values())
+
+    def with_prefix(self, prefix: str) -> List[VideoFile]:
+        return [video for name, video in self._videos.items() if name.startswith(prefix)]
+
+    def __len__(self) -> int:
+        return len(self._videos)
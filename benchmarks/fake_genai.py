@@ -0,0 +1,146 @@
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# Rough characters per token for latency modelling
+CHARS_PER_TOKEN = 4
+
+_COUNT_RE = re.compile(r"(\d+)\s+(?:questions|items|pieces|recommendations)")
+_SKILLS_RE = re.compile(r"Related Skills:\s*(.+)")
+
+
+class FakeAPIError(Exception):
+    """Injected failure, standing in for a 429 from the Gemini API."""
+
+    code = 429
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenAI:
+    """Offline stand-in for the `google.generativeai` module.
+
+    Replies are canned: JSON-mode requests get a synthetic instance of their
+    response schema (sized from the prompt, e.g. "with 5 questions"), plain
+    requests get `response_tokens` tokens of filler text. Each call sleeps
+    `latency` seconds before the first token plus one token per
+    1 / `tokens_per_second`, and fails with `failure_rate` probability.
+
+        registry = ModelRegistry(genai=FakeGenAI(latency=0.05))
+    """
+
+    def __init__(self, latency: float = 0.0, tokens_per_second: float | None = None,
+                 failure_rate: float = 0.0, response_tokens: int = 200, chunk_tokens: int = 8,
+                 respond: Callable[[str, Optional[Dict[str, Any]]], str] | None = None, seed: int = 0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self.response_tokens = response_tokens
+        self.chunk_tokens = chunk_tokens
+        self.respond = respond or self.canned_response
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def configure(self, api_key: str | None = None, **kwargs):
+        pass
+
+    def GenerativeModel(self, model_name: str, system_instruction: str | None = None, **kwargs) -> "FakeModel":
+        return FakeModel(self, model_name, system_instruction)
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"calls": 0, "failures": 0, "prompt_chars": 0, "response_chars": 0}
+
+    def _begin(self, prompt: str, generation_config: Optional[Dict[str, Any]]) -> str:
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["prompt_chars"] += len(prompt)
+            failed = self._random.random() < self.failure_rate
+            if failed:
+                self.stats["failures"] += 1
+        if failed:
+            raise FakeAPIError("429 Resource has been exhausted (injected)")
+        text = self.respond(prompt, generation_config)
+        with self._lock:
+            self.stats["response_chars"] += len(text)
+        return text
+
+    def _generation_time(self, text: str) -> float:
+        if not self.tokens_per_second:
+            return 0.0
+        return len(text) / CHARS_PER_TOKEN / self.tokens_per_second
+
+    def canned_response(self, prompt: str, generation_config: Optional[Dict[str, Any]]) -> str:
+        schema = (generation_config or {}).get("response_schema")
+        if schema is None:
+            return " ".join(["lorem"] * self.response_tokens)
+        match = _COUNT_RE.search(prompt)
+        count = int(match.group(1)) if match else 3
+        skills = _SKILLS_RE.search(prompt)
+        names = [skill.strip() for skill in skills.group(1).split(",")] if skills else []
+        if names and schema.get("type") == "array":
+            count = len(names)
+        value = _sample(schema, count)
+        if names:
+            for item, name in zip(value, names):
+                item["skill"] = name
+        return json.dumps(value)
+
+
+class FakeModel:
+    def __init__(self, backend: FakeGenAI, model_name: str, system_instruction: str | None):
+        self.backend = backend
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+
+    def generate_content(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None,
+                         stream: bool = False, **kwargs):
+        time.sleep(self.backend.latency)
+        text = self.backend._begin(prompt, generation_config)
+        if stream:
+            return self._stream(text)
+        time.sleep(self.backend._generation_time(text))
+        return FakeResponse(text)
+
+    def _stream(self, text: str) -> Iterator[FakeResponse]:
+        size = self.backend.chunk_tokens * CHARS_PER_TOKEN
+        for start in range(0, len(text), size):
+            chunk = text[start:start + size]
+            time.sleep(self.backend._generation_time(chunk))
+            yield FakeResponse(chunk)
+
+    async def generate_content_async(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None,
+                                     **kwargs):
+        await asyncio.sleep(self.backend.latency)
+        text = self.backend._begin(prompt, generation_config)
+        await asyncio.sleep(self.backend._generation_time(text))
+        return FakeResponse(text)
+
+
+def _sample(schema: Dict[str, Any], count: int, name: str = "value", index: int = 0) -> Any:
+    kind = schema.get("type")
+    if "enum" in schema:
+        return schema["enum"][index % len(schema["enum"])]
+    if kind == "array":
+        item_schema = schema.get("items", {"type": "string"})
+        # Length limits are not part of the response schema sent to the API,
+        # so nested lists default to four entries (the quiz's A-D options)
+        length = count if name == "value" else schema.get("minItems", 4)
+        return [_sample(item_schema, count, name, i) for i in range(length)]
+    if kind == "object":
+        return {key: _sample(sub, count, key, index) for key, sub in schema.get("properties", {}).items()}
+    if kind in ("number", "integer"):
+        low, high = schema.get("minimum", 0), schema.get("maximum", 1)
+        return low + (high - low) / 2 if kind == "number" else int(low)
+    if kind == "boolean":
+        return index % 2 == 0
+    return f"{name} {index + 1}"
+
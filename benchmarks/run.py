@@ -0,0 +1,413 @@
+"""Offline benchmarks for the LLM classes, the video catalog, skill matrix, quiz grading and the Flask routes.
+
+Every LLM call goes to benchmarks.fake_genai, so no API key or network is needed.
+
+    python -m benchmarks.run                                  # every suite
+    python -m benchmarks.run --suite catalog --sizes 1000 1000000
+    python -m benchmarks.run --save benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from benchmarks.fake_genai import FakeGenAI
+
+SUITES = ("llm", "catalog", "skills", "quiz", "flask")
+
+
+class Runner:
+    """Times benchmark callables and collects one result dict per benchmark."""
+
+    def __init__(self, fake: FakeGenAI, scale: float = 1.0, memory: bool = True):
+        self.fake = fake
+        self.scale = scale
+        self.memory = memory
+        self.results: List[Dict[str, Any]] = []
+
+    def measure(self, name: str, fn: Callable[[], Any], iterations: int, warmup: int = 1,
+                items: int = 1, **params) -> Dict[str, Any]:
+        """Time `iterations` calls of fn, then trace one more call for peak memory.
+
+        `items` is the number of operations one call performs (e.g. the
+        submissions in a batch), so throughput is reported per operation.
+        """
+        iterations = max(1, int(iterations * self.scale))
+        for _ in range(warmup):
+            fn()
+
+        calls, prompt_chars = self.fake.stats["calls"], self.fake.stats["prompt_chars"]
+        timings = np.empty(iterations)
+        for i in range(iterations):
+            started = time.perf_counter()
+            fn()
+            timings[i] = time.perf_counter() - started
+        calls = self.fake.stats["calls"] - calls
+        prompt_chars = self.fake.stats["prompt_chars"] - prompt_chars
+
+        peak = None
+        if self.memory:
+            tracemalloc.start()
+            try:
+                fn()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        result = {
+            "name": name,
+            "params": params,
+            "iterations": iterations,
+            "p50_ms": float(np.percentile(timings, 50) * 1000),
+            "p99_ms": float(np.percentile(timings, 99) * 1000),
+            "mean_ms": float(timings.mean() * 1000),
+            "throughput_per_s": float(iterations * items / timings.sum()) if timings.sum() else float("inf"),
+            "llm_calls": calls / iterations,
+            "prompt_chars": prompt_chars / calls if calls else 0,
+            "peak_memory_kib": peak / 1024 if peak is not None else None,
+        }
+        self.results.append(result)
+        print(_format_row(result), flush=True)
+        return result
+
+    def measure_build(self, name: str, build: Callable[[], Any], **params) -> Any:
+        """Run a one-off setup step, recording its duration and peak memory."""
+        if self.memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            value = build()
+            elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1] if self.memory else None
+        finally:
+            if self.memory:
+                tracemalloc.stop()
+        result = {
+            "name": name,
+            "params": params,
+            "iterations": 1,
+            "p50_ms": elapsed * 1000,
+            "p99_ms": elapsed * 1000,
+            "mean_ms": elapsed * 1000,
+            "throughput_per_s": 1 / elapsed if elapsed else float("inf"),
+            "llm_calls": 0,
+            "prompt_chars": 0,
+            "peak_memory_kib": peak / 1024 if peak is not None else None,
+        }
+        self.results.append(result)
+        print(_format_row(result), flush=True)
+        return value
+
+
+def _key(result: Dict[str, Any]) -> str:
+    params = ",".join(f"{k}={v}" for k, v in sorted(result["params"].items()))
+    return f"{result['name']}[{params}]" if params else result["name"]
+
+
+def _format_row(result: Dict[str, Any]) -> str:
+    peak = result["peak_memory_kib"]
+    return (f"{_key(result):<48} {result['iterations']:>6} {result['p50_ms']:>10.3f} {result['p99_ms']:>10.3f} "
+            f"{result['throughput_per_s']:>12.1f} {result['prompt_chars']:>9.0f} "
+            f"{'-' if peak is None else f'{peak:.0f}':>10}")
+
+
+def _header() -> str:
+    return (f"{'benchmark':<48} {'iters':>6} {'p50 ms':>10} {'p99 ms':>10} {'ops/s':>12} "
+            f"{'prompt':>9} {'peak KiB':>10}")
+
+
+def _consume(iterator) -> int:
+    return sum(1 for _ in iterator)
+
+
+def bench_llm(runner: Runner, iterations: int = 10, library_size: int = 50):
+    from llm.client import get_default_registry
+    from storage import SQLiteStorage
+    from LLMEnhancedLearningSystem import LLMEnhancedLearningSystem
+    from LLMEnhancedQuizPlatform import LLMEnhancedQuizPlatform
+    from Website.recommendation_system import LLMEnhancedRecommendationSystem
+
+    registry = get_default_registry()
+    storage = SQLiteStorage()
+    learning = LLMEnhancedLearningSystem(model_registry=registry, storage=storage)
+    for i in range(library_size):
+        learning.add_content(f"C{i:03d}", f"Course {i}", f"Lesson {i} about topic {i % 7}",
+                             [f"skill-{i % 11}", f"skill-{i % 5}"])
+    learning.add_user("bench-user", "Learn machine learning", "Some Python")
+    learning.assess_skills("bench-user", "C000", "I know loops", use_cache=False)
+
+    quizzes = LLMEnhancedQuizPlatform(model_registry=registry, storage=storage)
+    quiz = quizzes.create_quiz("Q0", "Python", "Beginner", 5, use_cache=False)
+    quizzes.take_quiz("bench-user", "Q0", [q['correct_answer'] for q in quiz['questions']])
+
+    recommender = LLMEnhancedRecommendationSystem(model_registry=registry)
+
+    # The response cache is bypassed throughout so every call pays the model latency
+    cold = {"use_cache": False}
+    runner.measure("learning.generate_learning_path", lambda: learning.generate_learning_path(
+        "bench-user", 5, **cold), iterations)
+    runner.measure("learning.stream_learning_path", lambda: _consume(learning.stream_learning_path(
+        "bench-user", 5, **cold)), iterations)
+    runner.measure("learning.recommend_content", lambda: learning.recommend_content("bench-user", 3, **cold),
+                   iterations)
+    runner.measure("learning.assess_skills", lambda: learning.assess_skills(
+        "bench-user", "C001", "I can write functions", **cold), iterations)
+    runner.measure("learning.generate_learning_path[cached]", lambda: learning.generate_learning_path(
+        "bench-user", 5), iterations * 10)
+
+    user_ids = [f"batch-user-{i}" for i in range(20)]
+    for user_id in user_ids:
+        learning.add_user(user_id, "Learn statistics", "None")
+
+    async def learning_paths():
+        async for result in learning.generate_learning_paths(user_ids, 5, concurrency=8):
+            if not result.ok:
+                raise result.error
+
+    # The batch APIs always use the cache, so empty it before each run
+    runner.measure("learning.generate_learning_paths", lambda: (registry.response_cache.clear(),
+                                                                asyncio.run(learning_paths())),
+                   max(1, iterations // 5), items=len(user_ids), users=len(user_ids))
+
+    recommendations = learning.recommend_content_batch(user_ids, 3)
+
+    async def explain():
+        async for result in learning.explain_recommendations(recommendations, concurrency=8):
+            if not result.ok:
+                raise result.error
+
+    runner.measure("learning.explain_recommendations", lambda: (registry.response_cache.clear(),
+                                                                asyncio.run(explain())),
+                   max(1, iterations // 5), items=len(user_ids), users=len(user_ids))
+
+    runner.measure("quiz.create_quiz", lambda: quizzes.create_quiz("Q1", "Python", "Beginner", 5, **cold),
+                   iterations)
+    runner.measure("quiz.stream_quiz", lambda: _consume(quizzes.stream_quiz("Q2", "Python", "Beginner", 5, **cold)),
+                   iterations)
+    runner.measure("quiz.stream_quiz[first]", lambda: next(iter(quizzes.stream_quiz(
+        "Q2", "Python", "Beginner", 5, **cold))), iterations)
+
+    specs = [{"quiz_id": f"QB{i}", "topic": f"Topic {i}", "difficulty": "Beginner", "num_questions": 5}
+             for i in range(20)]
+
+    async def create_quizzes():
+        async for result in quizzes.create_quizzes(specs, concurrency=8):
+            if not result.ok:
+                raise result.error
+
+    runner.measure("quiz.create_quizzes", lambda: (registry.response_cache.clear(), asyncio.run(create_quizzes())),
+                   max(1, iterations // 5),
+                   items=len(specs), quizzes=len(specs))
+    runner.measure("quiz.get_personalized_feedback", lambda: quizzes.get_personalized_feedback(
+        "bench-user", "Q0", **cold), iterations)
+    runner.measure("quiz.stream_personalized_feedback", lambda: _consume(quizzes.stream_personalized_feedback(
+        "bench-user", "Q0", **cold)), iterations)
+    runner.measure("quiz.recommend_next_quiz", lambda: quizzes.recommend_next_quiz("bench-user", **cold),
+                   iterations)
+
+    for mode in ("local", "rerank", "llm"):
+        runner.measure("videos.generate_learning_path", lambda mode=mode: recommender.generate_learning_path(
+            "python programming", ranking_mode=mode, **cold), iterations, mode=mode)
+
+
+def bench_catalog(runner: Runner, sizes: List[int], iterations: int = 20000):
+    from llm.embeddings import HashingEmbedder
+    from Website.Video import Video
+    from Website.event_log import EventLog
+    from Website.recommendation_system import LLMEnhancedRecommendationSystem
+
+    tags = [f"tag-{i}" for i in range(50)]
+    rng = random.Random(0)
+    for size in sizes:
+        # Every video is indexed too; 64 dimensions keep a million-video index at 256 MB
+        recommender = LLMEnhancedRecommendationSystem(embedder=HashingEmbedder(dim=64))
+
+        def build():
+            for i in range(size):
+                recommender.add_video(Video(f"video-{i}", tags[i % len(tags)]))
+
+        runner.measure_build("catalog.build", build, videos=size)
+        names = [f"video-{rng.randrange(size)}" for _ in range(4096)]
+        picks = iter(lambda: names[rng.randrange(len(names))], None)
+
+        runner.measure("catalog.view_video", lambda: recommender.view_video(next(picks)), iterations, videos=size)
+        runner.measure("catalog.like_video", lambda: recommender.like_video(next(picks)), iterations, videos=size)
+        runner.measure("catalog.get_video_by_name", lambda: recommender.get_video_by_name(next(picks)), iterations,
+                       videos=size)
+        runner.measure("catalog.get_popular_tags", lambda: recommender.get_popular_tags(3), iterations // 10,
+                       videos=size)
+        runner.measure("catalog.rank_local", lambda: recommender.generate_learning_path(
+            "python", ranking_mode="local"), max(10, iterations // 1000), videos=size)
+
+        with tempfile.TemporaryDirectory() as directory:
+            recommender.event_log = EventLog(directory)
+            runner.measure("catalog.view_video_logged", lambda: recommender.view_video(next(picks)), iterations,
+                           videos=size)
+            recommender.event_log.flush()
+            runner.measure("catalog.get_popular_tags_trending", lambda: recommender.get_popular_tags(
+                3, window=3600), iterations // 10, videos=size)
+            runner.measure("catalog.rank_local_trending", lambda: recommender.generate_learning_path(
+                "python", ranking_mode="local", half_life=3600), max(10, iterations // 1000), videos=size)
+            recommender.event_log.close()
+            recommender.event_log = None
+
+
+def bench_skills(runner: Runner, users: int = 100000, content: int = 500, skills: int = 200,
+                 skills_per_user: int = 8):
+    from skill_matrix import SkillMatrix
+
+    rng = np.random.default_rng(0)
+    names = [f"skill-{i}" for i in range(skills)]
+    matrix = SkillMatrix()
+    for i in range(content):
+        matrix.set_content(f"C{i}", [names[j] for j in rng.choice(skills, 3, replace=False)])
+    columns = rng.integers(0, skills, (users, skills_per_user))
+    scores = rng.random((users, skills_per_user))
+
+    def load():
+        for i in range(users):
+            matrix.set_user_skills(f"user-{i}", dict(zip([names[j] for j in columns[i]], scores[i].tolist())))
+
+    runner.measure_build("skills.load_users", load, users=users, skills=skills)
+    for k in (3, 10):
+        runner.measure("skills.top_k", lambda k=k: matrix.top_k(k=k), 3, warmup=0, items=users,
+                       users=users, content=content, k=k)
+
+
+def bench_quiz(runner: Runner, iterations: int = 2000, num_questions: int = 20, batch_size: int = 1000):
+    from llm.client import get_default_registry
+    from storage import SQLiteStorage
+    from LLMEnhancedQuizPlatform import LLMEnhancedQuizPlatform
+
+    quizzes = LLMEnhancedQuizPlatform(model_registry=get_default_registry(), storage=SQLiteStorage())
+    questions = [{"question": f"Q{i}", "options": ["A", "B", "C", "D"], "correct_answer": "ABCD"[i % 4],
+                  "explanation": "because"} for i in range(num_questions)]
+    quizzes.quizzes["GRADE"] = {"topic": "Grading", "difficulty": "Beginner", "questions": questions}
+    rng = random.Random(0)
+    answers = [[rng.choice("abcd") for _ in range(num_questions)] for _ in range(batch_size)]
+    picks = iter(lambda: answers[rng.randrange(batch_size)], None)
+
+    runner.measure("quiz.take_quiz", lambda: quizzes.take_quiz("grader", "GRADE", next(picks)), iterations,
+                   questions=num_questions)
+    submissions = {f"user-{i}": answer for i, answer in enumerate(answers)}
+    runner.measure("quiz.grade_batch", lambda: quizzes.grade_batch("GRADE", submissions),
+                   max(1, iterations // 200), items=batch_size, questions=num_questions, submissions=batch_size)
+
+
+def bench_flask(runner: Runner, iterations: int = 500):
+    from Website import create_app, get_quiz_platform
+
+    app = create_app()
+    quiz_platform = get_quiz_platform()
+    client = app.test_client()
+    quiz_platform.quizzes["FLASK"] = {"topic": "Flask", "difficulty": "Beginner", "questions": [
+        {"question": "Q", "options": ["A", "B", "C", "D"], "correct_answer": "A", "explanation": "because"}]}
+    quiz_platform.take_quiz("flask-user", "FLASK", ["A"])
+
+    def get(path: str):
+        response = client.get(path)
+        response.get_data()
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {path} returned {response.status_code}")
+
+    for path in ("/", "/courses", "/bVids", "/pVids", "/snippets"):
+        runner.measure("flask.get", lambda path=path: get(path), iterations, path=path)
+    runner.measure("flask.get", lambda: get("/quiz/flask-user/FLASK/feedback/stream?refresh=1"),
+                   max(1, iterations // 50), path="/quiz/<user>/<quiz>/feedback/stream")
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], threshold: float) -> int:
+    """Print p50/p99 changes against a saved run; returns the number of regressions."""
+    previous = {_key(result): result for result in baseline["results"]}
+    regressions = 0
+    print(f"\n{'benchmark':<48} {'p50 base':>10} {'p50 now':>10} {'change':>8} {'p99 change':>11}")
+    for result in results:
+        old = previous.get(_key(result))
+        if old is None or not old["p50_ms"]:
+            continue
+        change = result["p50_ms"] / old["p50_ms"] - 1
+        tail = result["p99_ms"] / old["p99_ms"] - 1 if old["p99_ms"] else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{_key(result):<48} {old['p50_ms']:>10.3f} {result['p50_ms']:>10.3f} {change:>+8.1%} "
+              f"{tail:>+11.1%}{flag}")
+    return regressions
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suite", nargs="+", choices=SUITES, default=list(SUITES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000, 1000000],
+                        help="catalog sizes for the catalog suite")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every iteration count")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake model time to first token, seconds")
+    parser.add_argument("--token-rate", type=float, default=2000.0, help="fake model tokens per second (0 = instant)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="probability each fake call fails")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak memory pass")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare against a JSON file written by --save")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative p50 slowdown reported as a regression (default 0.2)")
+    args = parser.parse_args(argv)
+
+    # Keep the Website module singletons off the real database and API
+    os.environ.setdefault("BYTESIZE_DB", ":memory:")
+    os.environ.pop("VIDEO_COUNTERS_DB", None)
+    os.environ.pop("VIDEO_EVENT_LOG_DIR", None)
+    # bench_flask imports Website, which must not rewrite the real video files
+    os.environ["VIDEO_FASTSTART"] = "0"
+    from llm.cache import ResponseCache
+    from llm.client import ModelRegistry, set_default_registry
+
+    fake = FakeGenAI(latency=args.latency, tokens_per_second=args.token_rate or None,
+                     failure_rate=args.failure_rate)
+    set_default_registry(ModelRegistry(response_cache=ResponseCache(), genai=fake))
+    runner = Runner(fake, scale=args.scale, memory=not args.no_memory)
+
+    print(_header())
+    if "llm" in args.suite:
+        bench_llm(runner)
+    if "catalog" in args.suite:
+        bench_catalog(runner, args.sizes)
+    if "skills" in args.suite:
+        bench_skills(runner)
+    if "quiz" in args.suite:
+        bench_quiz(runner)
+    if "flask" in args.suite:
+        bench_flask(runner)
+
+    run = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": runner.results,
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(run, f, indent=2)
+        print(f"\nSaved {len(runner.results)} results to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(runner.results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
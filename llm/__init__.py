@@ -0,0 +1,3 @@
+from .cache import ResponseCache, get_default_cache, make_cache_key
+from .client import ModelRegistry, get_default_registry, set_default_registry
+from .parsing import StructuredOutputError, extract_json, iter_stream_items, validate
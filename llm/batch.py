@@ -0,0 +1,103 @@
+import asyncio
+import random
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, Iterable, NamedTuple, Optional, Tuple
+
+from .metrics import LLM_BATCH_FAILURES, LLM_RETRIES
+
+
+class BatchResult(NamedTuple):
+    key: Hashable
+    value: Any = None
+    error: Optional[BaseException] = None
+    attempts: int = 1
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1.0):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+# HTTP statuses worth retrying: request timeout, rate limiting and server-side failures
+_TRANSIENT_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def is_transient(exc: BaseException) -> bool:
+    """True for errors a retry can fix: timeouts, dropped connections, 429s and 5xx responses.
+
+    google.api_core exceptions carry the HTTP status in `code`; anything
+    else (bad requests, auth failures, unparsable replies) is permanent.
+    """
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    return getattr(exc, "code", None) in _TRANSIENT_CODES
+
+
+# A job receives the zero-based attempt number so retries can e.g. bypass a cached bad response
+Job = Tuple[Hashable, Callable[[int], Awaitable[Any]]]
+
+
+async def run_batch(jobs: Iterable[Job], concurrency: int = 8, rate_limit: Optional[float] = None,
+                    retries: int = 3, backoff: float = 1.0, max_backoff: float = 30.0,
+                    operation: str = "batch",
+                    retry_on: Callable[[BaseException], bool] = is_transient) -> AsyncIterator[BatchResult]:
+    """Run jobs concurrently and yield a BatchResult for each one as it finishes.
+
+    At most `concurrency` jobs are in flight, and when `rate_limit` is set no
+    more than that many attempts start per second. Attempts that fail with an
+    error `retry_on` accepts (by default only transient API errors) are
+    retried with jittered exponential backoff; a job that fails any other way
+    or exhausts its retries is yielded with `error` set instead of aborting
+    the batch. Retries and
+    failures are counted in the metrics under `operation`.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = TokenBucket(rate_limit) if rate_limit else None
+
+    async def run_job(key: Hashable, job: Callable[[int], Awaitable[Any]]) -> BatchResult:
+        async with semaphore:
+            for attempt in range(retries + 1):
+                if bucket is not None:
+                    await bucket.acquire()
+                try:
+                    return BatchResult(key, await job(attempt), None, attempt + 1)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as exc:
+                    if attempt == retries or not retry_on(exc):
+                        LLM_BATCH_FAILURES.inc(operation=operation)
+                        return BatchResult(key, None, exc, attempt + 1)
+                    LLM_RETRIES.inc(operation=operation)
+                    delay = min(max_backoff, backoff * 2 ** attempt)
+                    await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    tasks = [asyncio.ensure_future(run_job(key, job)) for key, job in jobs]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+def make_cache_key(model_name: str, system_instruction: Optional[str], prompt: str,
+                   generation_config: Optional[Dict[str, Any]] = None) -> str:
+    digest = hashlib.sha256()
+    config = json.dumps(generation_config, sort_keys=True) if generation_config else ""
+    for part in (model_name, system_instruction or "", prompt, config):
+        data = part.encode("utf-8")
+        # Length-prefix every part so ("ab", "c") and ("a", "bc") never collide
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """Two-tier cache for LLM response text.
+
+    The memory tier is an LRU bounded by entry count and total bytes, the
+    optional disk tier is a SQLite file that survives restarts. Both tiers
+    honour the same TTL.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024,
+                 ttl: Optional[float] = 24 * 60 * 60, disk_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_path = disk_path
+
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "bypasses": 0}
+
+        self._db: Optional[sqlite3.Connection] = None
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL)"
+            )
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(created, now):
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return value
+                self._remove(key)
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT response, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created = row
+                    if not self._expired(created, now):
+                        self._store_memory(key, value, created)
+                        self._stats["disk_hits"] += 1
+                        return value
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: str):
+        created = time.time()
+        with self._lock:
+            self._store_memory(key, value, created)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created) VALUES (?, ?, ?)",
+                    (key, value, created),
+                )
+
+    def get_or_compute(self, model_name: str, system_instruction: Optional[str], prompt: str,
+                       compute: Callable[[], str], use_cache: bool = True,
+                       refresh: bool = False, generation_config: Optional[Dict[str, Any]] = None,
+                       validate: Optional[Callable[[str], Any]] = None) -> str:
+        """Return the cached response or compute and store a fresh one.
+
+        A fresh response is passed to `validate` first and is only stored if
+        that returns without raising; the exception propagates to the caller.
+        """
+        if not use_cache:
+            with self._lock:
+                self._stats["bypasses"] += 1
+            return compute()
+
+        key = make_cache_key(model_name, system_instruction, prompt, generation_config)
+        if not refresh:
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+
+        value = compute()
+        if validate is not None:
+            validate(value)
+        self.set(key, value)
+        return value
+
+    async def aget_or_compute(self, model_name: str, system_instruction: Optional[str], prompt: str,
+                              compute: Callable[[], Awaitable[str]], use_cache: bool = True,
+                              refresh: bool = False, generation_config: Optional[Dict[str, Any]] = None,
+                              validate: Optional[Callable[[str], Any]] = None) -> str:
+        if not use_cache:
+            with self._lock:
+                self._stats["bypasses"] += 1
+            return await compute()
+
+        key = make_cache_key(model_name, system_instruction, prompt, generation_config)
+        if not refresh:
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+
+        value = await compute()
+        if validate is not None:
+            validate(value)
+        self.set(key, value)
+        return value
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._remove(key)
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def _store_memory(self, key: str, value: str, created: float):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            # Too large for the memory tier; the disk tier (if any) still keeps it
+            self._remove(key)
+            return
+        self._remove(key)
+        self._entries[key] = (value, created)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats["evictions"] += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[0].encode("utf-8"))
+
+
+_default_cache: Optional[ResponseCache] = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache() -> ResponseCache:
+    """Process-wide cache shared by every LLM class unless one is passed in.
+
+    Configured through LLM_CACHE_PATH (enables the SQLite tier),
+    LLM_CACHE_TTL (seconds) and LLM_CACHE_MAX_ENTRIES.
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            ttl = os.getenv("LLM_CACHE_TTL")
+            _default_cache = ResponseCache(
+                max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024")),
+                ttl=float(ttl) if ttl else 24 * 60 * 60,
+                disk_path=os.getenv("LLM_CACHE_PATH") or None,
+            )
+        return _default_cache
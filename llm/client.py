@@ -0,0 +1,360 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .cache import ResponseCache, get_default_cache, make_cache_key
+from .metrics import (LLM_CACHE_LOOKUPS, LLM_CALL_SECONDS, LLM_PARSE_FAILURES, LLM_PROMPT_CHARS,
+                      LLM_RESPONSE_CHARS, current_operation, record_usage)
+from .parsing import (Schema, StructuredOutputError, array_of, extract_json, iter_stream_items,
+                      json_generation_config, parse_items, repair_prompt, validate)
+from .singleflight import SingleFlight
+
+
+class ModelRegistry:
+    """Builds each (model, system_instruction) pair once and shares it across threads.
+
+    google.generativeai is imported and configured on the first model request,
+    so constructing the LLM classes needs neither the SDK nor an API key.
+    Pass `genai` to use an already configured module with the same API
+    instead (e.g. the offline stand-in in benchmarks.fake_genai).
+
+    Identical cacheable requests that are in flight at the same time share
+    one API call; duplicates wait up to coalesce_timeout seconds for it.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, response_cache: Optional[ResponseCache] = None,
+                 genai: Any = None, coalesce_timeout: Optional[float] = 120.0):
+        self._api_key = api_key
+        self.response_cache = response_cache
+        self._genai = genai
+        self.single_flight = SingleFlight()
+        self.coalesce_timeout = coalesce_timeout
+        self._models: Dict[Tuple[str, Optional[str]], Any] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def genai(self):
+        if self._genai is None:
+            with self._lock:
+                if self._genai is None:
+                    self._genai = self._configure()
+        return self._genai
+
+    def _configure(self):
+        from dotenv import load_dotenv
+        import google.generativeai as genai
+
+        load_dotenv()
+        api_key = self._api_key or os.getenv('GOOGLE_API_KEY')
+        if not api_key:
+            raise ValueError("GOOGLE_API_KEY not found in environment variables")
+        genai.configure(api_key=api_key)
+        return genai
+
+    def get_model(self, model_name: str, system_instruction: Optional[str] = None):
+        key = (model_name, system_instruction)
+        model = self._models.get(key)
+        if model is None:
+            genai = self.genai
+            with self._lock:
+                model = self._models.get(key)
+                if model is None:
+                    model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+                    self._models[key] = model
+        return model
+
+    def generate_text(self, model_name: str, system_instruction: Optional[str], prompt: str,
+                      response_cache: Optional[ResponseCache] = None,
+                      use_cache: bool = True, refresh: bool = False,
+                      generation_config: Optional[Dict[str, Any]] = None,
+                      validate: Optional[Callable[[str], Any]] = None) -> str:
+        cache = response_cache or self.response_cache or get_default_cache()
+        called = False
+
+        def call_model() -> str:
+            model = self.get_model(model_name, system_instruction)
+            with _track_call(model_name, "generate", prompt) as track:
+                response = model.generate_content(prompt, generation_config=generation_config)
+                track(response)
+            return response.text
+
+        def compute() -> str:
+            nonlocal called
+            called = True
+            # use_cache=False asks for a fresh response, so only cacheable requests are coalesced
+            if not use_cache:
+                return call_model()
+            key = make_cache_key(model_name, system_instruction, prompt, generation_config)
+            return self.single_flight.do(key, call_model, self.coalesce_timeout)
+        text = cache.get_or_compute(model_name, system_instruction, prompt, compute,
+                                    use_cache=use_cache, refresh=refresh, generation_config=generation_config,
+                                    validate=validate)
+        _record_lookup(model_name, use_cache, called)
+        return text
+
+    async def generate_text_async(self, model_name: str, system_instruction: Optional[str], prompt: str,
+                                  response_cache: Optional[ResponseCache] = None,
+                                  use_cache: bool = True, refresh: bool = False,
+                                  generation_config: Optional[Dict[str, Any]] = None,
+                                  validate: Optional[Callable[[str], Any]] = None) -> str:
+        cache = response_cache or self.response_cache or get_default_cache()
+        called = False
+
+        async def call_model() -> str:
+            model = self.get_model(model_name, system_instruction)
+            with _track_call(model_name, "async", prompt) as track:
+                response = await model.generate_content_async(prompt, generation_config=generation_config)
+                track(response)
+            return response.text
+
+        async def compute() -> str:
+            nonlocal called
+            called = True
+            if not use_cache:
+                return await call_model()
+            key = make_cache_key(model_name, system_instruction, prompt, generation_config)
+            return await self.single_flight.do_async(key, call_model, self.coalesce_timeout)
+        text = await cache.aget_or_compute(model_name, system_instruction, prompt, compute,
+                                           use_cache=use_cache, refresh=refresh,
+                                           generation_config=generation_config, validate=validate)
+        _record_lookup(model_name, use_cache, called)
+        return text
+
+    def stream_text(self, model_name: str, system_instruction: Optional[str], prompt: str,
+                    response_cache: Optional[ResponseCache] = None,
+                    use_cache: bool = True, refresh: bool = False,
+                    generation_config: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """Yield response text as the model produces it.
+
+        A cached response is yielded as a single chunk. A fresh response is
+        cached only once the stream has been consumed to the end.
+        """
+        cache = response_cache or self.response_cache or get_default_cache()
+        key = make_cache_key(model_name, system_instruction, prompt, generation_config)
+        if use_cache and not refresh:
+            cached = cache.get(key)
+            if cached is not None:
+                _record_lookup(model_name, use_cache, False)
+                yield cached
+                return
+        _record_lookup(model_name, use_cache, True)
+
+        chunks = []
+        model = self.get_model(model_name, system_instruction)
+        # Timed from the request to the last chunk, including time the consumer spends between chunks
+        with _track_call(model_name, "stream", prompt) as track:
+            for chunk in model.generate_content(prompt, generation_config=generation_config, stream=True):
+                track(chunk)
+                text = chunk.text
+                chunks.append(text)
+                yield text
+        if use_cache:
+            cache.set(key, "".join(chunks))
+
+    def generate_items(self, model_name: str, system_instruction: Optional[str], prompt: str,
+                       item_schema: Schema, response_cache: Optional[ResponseCache] = None,
+                       use_cache: bool = True, refresh: bool = False) -> List[Any]:
+        """Request a JSON array of `item_schema` items in JSON mode and validate each one.
+
+        Only the items that fail validation are sent back to the model for
+        repair. Raises StructuredOutputError when the reply is not an array
+        or an item is still invalid after repair.
+        """
+        config = json_generation_config(array_of(item_schema))
+        parsed = _Parsed(lambda text: _parse_array(text, item_schema, model_name))
+        raw_text = self.generate_text(model_name, system_instruction, prompt, response_cache,
+                                      use_cache=use_cache, refresh=refresh, generation_config=config,
+                                      validate=parsed)
+        items, invalid = self._result(parsed, raw_text, response_cache, model_name, system_instruction, prompt,
+                                      config)
+        if invalid:
+            check = _Parsed(lambda text: _check_repaired(text, invalid, item_schema, model_name))
+            fix_prompt = repair_prompt(invalid, item_schema)
+            repaired = self.generate_text(model_name, system_instruction, fix_prompt,
+                                          response_cache, generation_config=config, validate=check)
+            fixed = self._result(check, repaired, response_cache, model_name, system_instruction, fix_prompt, config)
+            for index, item in zip(invalid, fixed):
+                items[index] = item
+        return items
+
+    async def generate_items_async(self, model_name: str, system_instruction: Optional[str], prompt: str,
+                                   item_schema: Schema, response_cache: Optional[ResponseCache] = None,
+                                   use_cache: bool = True, refresh: bool = False) -> List[Any]:
+        config = json_generation_config(array_of(item_schema))
+        parsed = _Parsed(lambda text: _parse_array(text, item_schema, model_name))
+        raw_text = await self.generate_text_async(model_name, system_instruction, prompt, response_cache,
+                                                  use_cache=use_cache, refresh=refresh, generation_config=config,
+                                                  validate=parsed)
+        items, invalid = self._result(parsed, raw_text, response_cache, model_name, system_instruction, prompt,
+                                      config)
+        if invalid:
+            check = _Parsed(lambda text: _check_repaired(text, invalid, item_schema, model_name))
+            fix_prompt = repair_prompt(invalid, item_schema)
+            repaired = await self.generate_text_async(model_name, system_instruction, fix_prompt, response_cache,
+                                                      generation_config=config, validate=check)
+            fixed = self._result(check, repaired, response_cache, model_name, system_instruction, fix_prompt, config)
+            for index, item in zip(invalid, fixed):
+                items[index] = item
+        return items
+
+    def stream_items(self, model_name: str, system_instruction: Optional[str], prompt: str,
+                     item_schema: Schema, response_cache: Optional[ResponseCache] = None,
+                     use_cache: bool = True, refresh: bool = False) -> Iterator[Any]:
+        """Like generate_items, but yield each valid item as soon as it has streamed in.
+
+        Invalid items are repaired once the stream ends and yielded last.
+        """
+        config = json_generation_config(array_of(item_schema))
+        chunks = self.stream_text(model_name, system_instruction, prompt, response_cache,
+                                  use_cache=use_cache, refresh=refresh, generation_config=config)
+        invalid: Dict[int, Tuple[Any, List[str]]] = {}
+        try:
+            for index, item in enumerate(iter_stream_items(chunks)):
+                errors = validate(item, item_schema)
+                if errors:
+                    invalid[index] = (item, errors)
+                else:
+                    yield item
+        except StructuredOutputError:
+            _record_parse_failure(model_name, "unparsable")
+            # stream_text caches the reply once the stream ends, before the parser has seen all of it
+            self._drop_cached(response_cache, model_name, system_instruction, prompt, config)
+            raise
+        if invalid:
+            _record_parse_failure(model_name, "invalid_item", len(invalid))
+            check = _Parsed(lambda text: _check_repaired(text, invalid, item_schema, model_name))
+            fix_prompt = repair_prompt(invalid, item_schema)
+            repaired = self.generate_text(model_name, system_instruction, fix_prompt, response_cache,
+                                          generation_config=config, validate=check)
+            yield from self._result(check, repaired, response_cache, model_name, system_instruction, fix_prompt,
+                                    config)
+
+    def _result(self, parsed: "_Parsed", raw_text: str, response_cache: Optional[ResponseCache], model_name: str,
+                system_instruction: Optional[str], prompt: str, generation_config: Dict[str, Any]) -> Any:
+        """parsed.result(raw_text), dropping the reply from the cache if it does not parse.
+
+        Fresh replies that fail were never stored, but one cached before it
+        was validated would otherwise be served until it expires.
+        """
+        try:
+            return parsed.result(raw_text)
+        except StructuredOutputError:
+            self._drop_cached(response_cache, model_name, system_instruction, prompt, generation_config)
+            raise
+
+    def _drop_cached(self, response_cache: Optional[ResponseCache], model_name: str,
+                     system_instruction: Optional[str], prompt: str, generation_config: Dict[str, Any]):
+        cache = response_cache or self.response_cache or get_default_cache()
+        cache.invalidate(make_cache_key(model_name, system_instruction, prompt, generation_config))
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+
+@contextmanager
+def _track_call(model_name: str, kind: str, prompt: str):
+    """Time one API call; the body passes each response (or stream chunk) to the yielded callback."""
+    operation = current_operation()
+    LLM_PROMPT_CHARS.observe(len(prompt), operation=operation, model=model_name)
+    received = []
+    size = 0
+
+    def track(response: Any):
+        nonlocal size
+        size += len(response.text)
+        received[:] = [response]
+
+    status = "error"
+    started = time.perf_counter()
+    try:
+        yield track
+        status = "ok"
+    except GeneratorExit:
+        status = "closed"
+        raise
+    finally:
+        LLM_CALL_SECONDS.observe(time.perf_counter() - started, operation=operation, model=model_name,
+                                 kind=kind, status=status)
+        if received:
+            LLM_RESPONSE_CHARS.observe(size, operation=operation, model=model_name)
+            # Streamed usage metadata is cumulative, so the last chunk carries the totals
+            record_usage(model_name, received[-1], operation)
+
+
+def _record_lookup(model_name: str, use_cache: bool, called: bool):
+    result = "bypass" if not use_cache else "miss" if called else "hit"
+    LLM_CACHE_LOOKUPS.inc(operation=current_operation(), model=model_name, result=result)
+
+
+def _record_parse_failure(model_name: str, reason: str, count: int = 1):
+    LLM_PARSE_FAILURES.inc(count, operation=current_operation(), model=model_name, reason=reason)
+
+
+class _Parsed:
+    """A cache `validate` callback that keeps what it parsed, so a fresh reply is parsed only once."""
+
+    def __init__(self, parse: Callable[[str], Any]):
+        self._parse = parse
+        self._parsed: Dict[str, Any] = {}
+
+    def __call__(self, raw_text: str):
+        self._parsed[raw_text] = self._parse(raw_text)
+
+    def result(self, raw_text: str) -> Any:
+        # Cached replies were never passed to the callback
+        if raw_text not in self._parsed:
+            self(raw_text)
+        return self._parsed[raw_text]
+
+
+def _parse_array(raw_text: str, item_schema: Schema,
+                 model_name: str) -> Tuple[List[Any], Dict[int, Tuple[Any, List[str]]]]:
+    try:
+        parsed = extract_json(raw_text)
+    except StructuredOutputError:
+        _record_parse_failure(model_name, "unparsable")
+        raise
+    if not isinstance(parsed, list):
+        _record_parse_failure(model_name, "not_array")
+        raise StructuredOutputError(f"expected a JSON array, got {type(parsed).__name__}")
+    items, invalid = parse_items(parsed, item_schema)
+    if invalid:
+        _record_parse_failure(model_name, "invalid_item", len(invalid))
+    return items, invalid
+
+
+def _check_repaired(raw_text: str, invalid: Dict[int, Tuple[Any, List[str]]], item_schema: Schema,
+                    model_name: str) -> List[Any]:
+    try:
+        repaired = extract_json(raw_text)
+        if not isinstance(repaired, list) or len(repaired) != len(invalid):
+            raise StructuredOutputError("repair did not return one item per invalid item")
+        for item in repaired:
+            errors = validate(item, item_schema)
+            if errors:
+                raise StructuredOutputError(f"item still invalid after repair: {'; '.join(errors)}")
+    except StructuredOutputError:
+        _record_parse_failure(model_name, "repair_failed")
+        raise
+    return repaired
+
+
+_default_registry: Optional[ModelRegistry] = None
+_default_lock = threading.Lock()
+
+
+def get_default_registry() -> ModelRegistry:
+    global _default_registry
+    with _default_lock:
+        if _default_registry is None:
+            _default_registry = ModelRegistry()
+        return _default_registry
+
+
+def set_default_registry(registry: Optional[ModelRegistry]):
+    global _default_registry
+    with _default_lock:
+        _default_registry = registry
@@ -0,0 +1,200 @@
+import math
+import re
+import threading
+import zlib
+from typing import Dict, Hashable, Iterable, List, Optional, Protocol, Tuple
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _grown(matrix: Optional[np.ndarray], rows: int, dim: int) -> np.ndarray:
+    """matrix copied into a zero matrix with room for at least `rows` rows, doubling as needed."""
+    if matrix is None:
+        return np.zeros((max(16, rows), dim), dtype=np.float32)
+    capacity = matrix.shape[0]
+    while capacity < rows:
+        capacity *= 2
+    if capacity == matrix.shape[0]:
+        return matrix
+    grown = np.zeros((capacity, matrix.shape[1]), dtype=matrix.dtype)
+    grown[:matrix.shape[0]] = matrix
+    return grown
+
+
+class Embedder(Protocol):
+    def embed(self, texts: List[str]) -> np.ndarray:
+        ...
+
+
+class HashingEmbedder:
+    """Offline TF-IDF embedder using the hashing trick over word uni/bigrams.
+
+    Tokens are hashed with crc32 so vectors are stable across processes.
+    `fit` learns IDF weights from a corpus; unfitted it is plain
+    sublinear TF. Rows are L2-normalised, so a dot product is cosine similarity.
+    """
+
+    def __init__(self, dim: int = 1024, ngrams: int = 2):
+        self.dim = dim
+        self.ngrams = ngrams
+        self.idf: Optional[np.ndarray] = None
+
+    def _buckets(self, text: str) -> Dict[int, int]:
+        tokens = _TOKEN_RE.findall(text.lower())
+        counts: Dict[int, int] = {}
+        for n in range(1, self.ngrams + 1):
+            for i in range(len(tokens) - n + 1):
+                bucket = zlib.crc32(" ".join(tokens[i:i + n]).encode("utf-8")) % self.dim
+                counts[bucket] = counts.get(bucket, 0) + 1
+        return counts
+
+    def fit(self, texts: Iterable[str]) -> "HashingEmbedder":
+        df = np.zeros(self.dim, dtype=np.float32)
+        n_docs = 0
+        for text in texts:
+            n_docs += 1
+            df[list(self._buckets(text))] += 1
+        self.idf = idf_weights(df, n_docs)
+        return self
+
+    def term_frequencies(self, texts: List[str]) -> np.ndarray:
+        """Sublinear TF rows, before IDF weighting and normalisation."""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for bucket, count in self._buckets(text).items():
+                matrix[row, bucket] = 1 + math.log(count)
+        return matrix
+
+    def weigh(self, matrix: np.ndarray, idf: Optional[np.ndarray] = None) -> np.ndarray:
+        """Scale TF rows by `idf` (default: the fitted weights) and L2-normalise them."""
+        idf = self.idf if idf is None else idf
+        if idf is not None:
+            matrix = matrix * idf
+        return _normalised(matrix)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return self.weigh(self.term_frequencies(texts))
+
+
+def idf_weights(df: np.ndarray, n_docs: int) -> np.ndarray:
+    return (np.log((1 + n_docs) / (1 + df)) + 1).astype(np.float32)
+
+
+def _normalised(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+class VectorIndex:
+    """Cosine-similarity index over short texts, backed by one NumPy matrix.
+
+    Each added text is embedded once into its own row; the matrix doubles in
+    capacity as it fills and a removed row is filled with the last one. With
+    an embedder that has IDF weights (HashingEmbedder) the index keeps its
+    own document frequencies: new rows are weighted with the current IDF, and
+    the IDF is refitted, re-weighting the existing rows in place, on the
+    first query after more than `refit_ratio` of the corpus has changed.
+    """
+
+    def __init__(self, embedder: Optional[Embedder] = None, refit_ratio: float = 0.1):
+        self.embedder = embedder or HashingEmbedder()
+        self.refit_ratio = refit_ratio
+        self._texts: Dict[Hashable, str] = {}
+        self._rows: Dict[Hashable, int] = {}
+        self._keys: List[Hashable] = []
+        # Handed out by similarities(); replaced only when the keys change
+        self._key_list: Optional[List[Hashable]] = None
+        self._matrix: Optional[np.ndarray] = None
+        self._tf_idf = hasattr(self.embedder, "term_frequencies")
+        self._df: Optional[np.ndarray] = None
+        self._idf: Optional[np.ndarray] = None
+        self._fitted_docs = 0
+        self._changes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def _vectors(self, texts: List[str]) -> np.ndarray:
+        if self._tf_idf:
+            return self.embedder.term_frequencies(texts)
+        return self.embedder.embed(texts)
+
+    def _weigh(self, vectors: np.ndarray) -> np.ndarray:
+        if not self._tf_idf:
+            return vectors
+        return _normalised(vectors * self._idf if self._idf is not None else vectors)
+
+    def add(self, key: Hashable, text: str):
+        vector = self._vectors([text])[0]
+        with self._lock:
+            self._texts[key] = text
+            row = self._rows.get(key)
+            if row is None:
+                row = self._rows[key] = len(self._keys)
+                self._keys.append(key)
+                self._key_list = None
+                self._matrix = _grown(self._matrix, row + 1, vector.shape[0])
+            elif self._df is not None:
+                self._df -= self._matrix[row] != 0
+            if self._tf_idf:
+                if self._df is None:
+                    self._df = np.zeros(vector.shape[0], dtype=np.float32)
+                self._df += vector != 0
+            self._matrix[row] = self._weigh(vector[None, :])[0]
+            self._changes += 1
+
+    def remove(self, key: Hashable):
+        with self._lock:
+            self._texts.pop(key, None)
+            row = self._rows.pop(key, None)
+            if row is None:
+                return
+            if self._df is not None:
+                self._df -= self._matrix[row] != 0
+            last = len(self._keys) - 1
+            if row != last:
+                moved = self._keys[row] = self._keys[last]
+                self._rows[moved] = row
+                self._matrix[row] = self._matrix[last]
+            self._keys.pop()
+            self._matrix[last] = 0.0
+            self._key_list = None
+            self._changes += 1
+
+    def _refit(self):
+        if self._df is None or self._changes <= self.refit_ratio * self._fitted_docs:
+            return
+        n = len(self._keys)
+        idf = idf_weights(self._df, n)
+        # Rows are normalised tf * old idf, so rescaling by new / old and renormalising re-weights them
+        rows = self._matrix[:n]
+        rows *= idf / self._idf if self._idf is not None else idf
+        rows[:] = _normalised(rows)
+        self._idf = idf
+        self._fitted_docs = n
+        self._changes = 0
+
+    def similarities(self, query: str) -> Tuple[List[Hashable], np.ndarray]:
+        """Cosine similarity of `query` to every indexed text, in index order."""
+        query_vector = self._vectors([query])
+        with self._lock:
+            if not self._keys:
+                return [], np.zeros(0, dtype=np.float32)
+            self._refit()
+            if self._key_list is None:
+                self._key_list = list(self._keys)
+            return self._key_list, self._matrix[:len(self._keys)] @ self._weigh(query_vector)[0]
+    def top_k(self, query: str, k: int) -> List[Tuple[Hashable, float]]:
+        keys, scores = self.similarities(query)
+        if k <= 0 or not keys:
+            return []
+        if k < len(keys):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(keys))
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(keys[i], float(scores[i])) for i in ranked]
@@ -0,0 +1,301 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (100, 300, 1000, 3000, 10000, 30000, 100000, 300000)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._label_values(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(_Metric):
+    """A value that can go up and down, or be read from a callback at render time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 function: Callable[[], Dict[LabelValues, float]] | None = None):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._function = function
+
+    def set(self, value: float, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        if self._function is not None:
+            values.update(self._function())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = SECONDS_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: per-bucket (non-cumulative) counts, sum, count
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            counts, totals = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0, 0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._label_values(labels))
+        return int(entry[1][1]) if entry else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), list(totals))) for key, (counts, totals) in self._values.items())
+        lines = []
+        for key, (counts, (total, count)) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {int(count)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics of this process, rendered in the Prometheus text format.
+
+    Metrics live in process memory, so with several worker processes each
+    worker's /metrics reports its own share.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"metric {metric.name} is already registered with a different type or labels")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = (),
+              function: Callable[[], Dict[LabelValues, float]] | None = None) -> Gauge:
+        return self._register(Gauge(name, help, labelnames, function))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = SECONDS_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Prometheus exposition format content type
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LLM_OPERATION_SECONDS = REGISTRY.histogram(
+    "llm_operation_seconds", "Wall time of LLM-backed methods, including prompt building and parsing.",
+    ("operation", "status"))
+LLM_CALL_SECONDS = REGISTRY.histogram(
+    "llm_call_seconds", "Wall time of Gemini API calls (cache misses only).", ("operation", "model", "kind", "status"))
+LLM_CACHE_LOOKUPS = REGISTRY.counter(
+    "llm_cache_lookups_total", "Response cache lookups by result (hit, miss, bypass).", ("operation", "model", "result"))
+LLM_PROMPT_CHARS = REGISTRY.histogram(
+    "llm_prompt_chars", "Characters per prompt sent to the model.", ("operation", "model"), SIZE_BUCKETS)
+LLM_RESPONSE_CHARS = REGISTRY.histogram(
+    "llm_response_chars", "Characters per model response.", ("operation", "model"), SIZE_BUCKETS)
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "Tokens reported by the API usage metadata.", ("operation", "model", "type"))
+LLM_PARSE_FAILURES = REGISTRY.counter(
+    "llm_parse_failures_total", "Responses or items that failed structured parsing.", ("operation", "model", "reason"))
+LLM_COALESCED = REGISTRY.counter(
+    "llm_singleflight_coalesced_total", "Calls that waited on an identical in-flight request instead of calling the API.",
+    ("operation",))
+LLM_RETRIES = REGISTRY.counter(
+    "llm_retries_total", "Retried attempts in batch runs.", ("operation",))
+LLM_BATCH_FAILURES = REGISTRY.counter(
+    "llm_batch_failures_total", "Batch jobs that failed after exhausting their retries.", ("operation",))
+
+_operation: contextvars.ContextVar[str] = contextvars.ContextVar("llm_operation", default="other")
+
+
+def current_operation() -> str:
+    """Name of the innermost LLM-backed method running in this context."""
+    return _operation.get()
+
+
+def instrumented(operation: str):
+    """Label every model call made inside the decorated method with `operation` and time the method.
+
+    Works for plain functions, coroutines and generators; a generator is
+    timed from the first to the last item it produces.
+    """
+    def decorate(fn):
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args, **kwargs):
+                iterator = fn(*args, **kwargs)
+                status = "error"
+                started = time.perf_counter()
+                try:
+                    while True:
+                        token = _operation.set(operation)
+                        try:
+                            item = next(iterator)
+                        except StopIteration:
+                            status = "ok"
+                            return
+                        finally:
+                            _operation.reset(token)
+                        yield item
+                except GeneratorExit:
+                    # The consumer stopped early, e.g. a client disconnected from a stream
+                    status = "closed"
+                    raise
+                finally:
+                    iterator.close()
+                    LLM_OPERATION_SECONDS.observe(time.perf_counter() - started, operation=operation, status=status)
+            return generator_wrapper
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def coroutine_wrapper(*args, **kwargs):
+                token = _operation.set(operation)
+                status = "error"
+                started = time.perf_counter()
+                try:
+                    result = await fn(*args, **kwargs)
+                    status = "ok"
+                    return result
+                finally:
+                    _operation.reset(token)
+                    LLM_OPERATION_SECONDS.observe(time.perf_counter() - started, operation=operation, status=status)
+            return coroutine_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = _operation.set(operation)
+            status = "error"
+            started = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+                status = "ok"
+                return result
+            finally:
+                _operation.reset(token)
+                LLM_OPERATION_SECONDS.observe(time.perf_counter() - started, operation=operation, status=status)
+        return wrapper
+
+    return decorate
+
+
+def record_usage(model_name: str, response: Any, operation: str | None = None):
+    """Count prompt/response tokens from a Gemini response's usage metadata, if it has any."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    operation = operation or current_operation()
+    for kind, field in (("prompt", "prompt_token_count"), ("response", "candidates_token_count")):
+        count = getattr(usage, field, None)
+        if count:
+            LLM_TOKENS.inc(count, operation=operation, model=model_name, type=kind)
@@ -0,0 +1,283 @@
+import ast
+import json
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+Schema = Dict[str, Any]
+
+LEARNING_PATH_ITEM: Schema = {
+    "type": "object",
+    "properties": {
+        "content_id": {"type": "string"},
+        "explanation": {"type": "string"},
+        "relevance_to_goals": {"type": "string"},
+    },
+    "required": ["content_id", "explanation", "relevance_to_goals"],
+}
+
+RECOMMENDATION: Schema = {
+    "type": "object",
+    "properties": {
+        "content_id": {"type": "string"},
+        "explanation": {"type": "string"},
+        "skill_alignment": {"type": "string"},
+    },
+    "required": ["content_id", "explanation", "skill_alignment"],
+}
+
+# Gemini response schemas cannot express free-form object keys, so skills are
+# requested as a list and folded back into {skill: {score, feedback}}
+SKILL_ASSESSMENT: Schema = {
+    "type": "object",
+    "properties": {
+        "skill": {"type": "string"},
+        "score": {"type": "number", "minimum": 0, "maximum": 1},
+        "feedback": {"type": "string"},
+    },
+    "required": ["skill", "score", "feedback"],
+}
+
+QUIZ_QUESTION: Schema = {
+    "type": "object",
+    "properties": {
+        "question": {"type": "string"},
+        "options": {"type": "array", "items": {"type": "string"}, "minItems": 4, "maxItems": 4},
+        "correct_answer": {"type": "string", "enum": ["A", "B", "C", "D"]},
+        "explanation": {"type": "string"},
+    },
+    "required": ["question", "options", "correct_answer", "explanation"],
+}
+
+VIDEO_PATH_ITEM: Schema = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "tag": {"type": "string"},
+    },
+    "required": ["name", "tag"],
+}
+
+
+class StructuredOutputError(ValueError):
+    """The model response could not be parsed into the expected structure."""
+
+
+def array_of(item_schema: Schema) -> Schema:
+    return {"type": "array", "items": item_schema}
+
+
+# Keys the Gemini Schema proto accepts; the rest are only enforced by validate()
+_RESPONSE_SCHEMA_KEYS = {"type", "format", "description", "nullable", "enum", "properties", "required", "items"}
+
+
+def to_response_schema(schema: Schema) -> Schema:
+    converted = {key: value for key, value in schema.items() if key in _RESPONSE_SCHEMA_KEYS}
+    if "properties" in converted:
+        converted["properties"] = {name: to_response_schema(sub) for name, sub in converted["properties"].items()}
+    if "items" in converted:
+        converted["items"] = to_response_schema(converted["items"])
+    return converted
+
+
+def json_generation_config(schema: Schema) -> Dict[str, Any]:
+    return {"response_mime_type": "application/json", "response_schema": to_response_schema(schema)}
+
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+}
+
+
+def validate(value: Any, schema: Schema, path: str = "$") -> List[str]:
+    """Check `value` against a small JSON Schema subset; returns the list of problems."""
+    expected = schema.get("type")
+    if expected is not None:
+        if isinstance(value, bool) and expected in ("integer", "number"):
+            return [f"{path}: expected {expected}, got boolean"]
+        if not isinstance(value, _TYPES[expected]):
+            return [f"{path}: expected {expected}, got {type(value).__name__}"]
+
+    errors = []
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path}: {value!r} is not one of {schema['enum']}")
+    if "minimum" in schema and value < schema["minimum"]:
+        errors.append(f"{path}: {value} is below {schema['minimum']}")
+    if "maximum" in schema and value > schema["maximum"]:
+        errors.append(f"{path}: {value} is above {schema['maximum']}")
+    if isinstance(value, dict):
+        for name in schema.get("required", []):
+            if name not in value:
+                errors.append(f"{path}: missing '{name}'")
+        for name, sub in schema.get("properties", {}).items():
+            if name in value:
+                errors.extend(validate(value[name], sub, f"{path}.{name}"))
+    if isinstance(value, list):
+        if "minItems" in schema and len(value) < schema["minItems"]:
+            errors.append(f"{path}: expected at least {schema['minItems']} items")
+        if "maxItems" in schema and len(value) > schema["maxItems"]:
+            errors.append(f"{path}: expected at most {schema['maxItems']} items")
+        if "items" in schema:
+            for i, item in enumerate(value):
+                errors.extend(validate(item, schema["items"], f"{path}[{i}]"))
+    return errors
+
+
+_FENCE_RE = re.compile(r"```[a-zA-Z]*")
+
+
+def _loads(text: str) -> Any:
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        # Prompts without JSON mode historically asked for Python literals
+        return ast.literal_eval(text)
+
+
+def extract_json(text: str) -> Any:
+    """Parse the first JSON (or Python literal) array/object in a model reply.
+
+    Markdown fences and prose around the value are ignored.
+    """
+    cleaned = _FENCE_RE.sub("", text).strip()
+    try:
+        return _loads(cleaned)
+    except (ValueError, SyntaxError):
+        pass
+    starts = [i for i in (cleaned.find("["), cleaned.find("{")) if i != -1]
+    if not starts:
+        raise StructuredOutputError(f"no JSON value in response: {text[:200]!r}")
+    start = min(starts)
+    end = _matching_close(cleaned, start)
+    if end is None:
+        raise StructuredOutputError(f"unterminated JSON value in response: {text[:200]!r}")
+    try:
+        return _loads(cleaned[start:end + 1])
+    except (ValueError, SyntaxError) as exc:
+        raise StructuredOutputError(f"unparsable JSON value in response: {exc}") from exc
+
+
+def _matching_close(text: str, start: int) -> Optional[int]:
+    depth = 0
+    quote = None
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char in "[{":
+            depth += 1
+        elif char in "]}":
+            depth -= 1
+            if depth == 0:
+                return i
+    return None
+
+
+class IncrementalArrayParser:
+    """Split a streamed top-level array into elements as soon as each one closes.
+
+    feed() returns the raw text of every element completed by the chunk;
+    text before the opening bracket (fences, prose) is skipped.
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._started = False
+        self._done = False
+        self._depth = 0
+        self._quote: Optional[str] = None
+        self._escaped = False
+
+    def feed(self, chunk: str) -> List[str]:
+        elements = []
+        for char in chunk:
+            if self._done:
+                break
+            if not self._started:
+                if char == "[":
+                    self._started = True
+                continue
+            if self._quote:
+                self._buffer.append(char)
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == self._quote:
+                    self._quote = None
+                continue
+            if self._depth == 0 and char in ",]":
+                element = "".join(self._buffer).strip()
+                if element:
+                    elements.append(element)
+                self._buffer = []
+                self._done = char == "]"
+                continue
+            if char in "\"'":
+                self._quote = char
+            elif char in "[{":
+                self._depth += 1
+            elif char in "]}":
+                self._depth -= 1
+            self._buffer.append(char)
+        return elements
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+
+def parse_items(items: Iterable[Any], item_schema: Schema) -> Tuple[List[Any], Dict[int, Tuple[Any, List[str]]]]:
+    """Validate parsed items; returns (items, {index: (bad item, errors)})."""
+    items = list(items)
+    invalid = {}
+    for i, item in enumerate(items):
+        errors = validate(item, item_schema)
+        if errors:
+            invalid[i] = (item, errors)
+    return items, invalid
+
+
+def parse_element(text: str) -> Any:
+    try:
+        return _loads(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def repair_prompt(invalid: Dict[int, Tuple[Any, List[str]]], item_schema: Schema) -> str:
+    broken = "\n".join(f"- {json.dumps(item, default=str) if not isinstance(item, str) else item}: "
+                       f"{'; '.join(errors)}" for item, errors in invalid.values())
+    return f"""
+        The following items do not match the required JSON schema. Fix each one,
+        keeping its content, and return a JSON array with exactly {len(invalid)} items
+        in the same order.
+
+        Schema for each item:
+        {json.dumps(item_schema)}
+
+        Items and problems:
+        {broken}
+        """
+
+
+def iter_stream_items(chunks: Iterable[str]) -> Iterator[Any]:
+    """Yield parsed elements of a streamed JSON array as soon as each completes."""
+    parser = IncrementalArrayParser()
+    for chunk in chunks:
+        for element in parser.feed(chunk):
+            yield parse_element(element)
+    if not parser.done:
+        raise StructuredOutputError("stream ended before the JSON array was closed")
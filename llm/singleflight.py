@@ -0,0 +1,97 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from .metrics import LLM_COALESCED, current_operation
+
+
+class _Call:
+    __slots__ = ("done", "value", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for its result, or get its exception re-raised. Nothing
+    is remembered once the call finishes, so this only deduplicates bursts;
+    pair it with a cache for anything longer lived. Thread callers (do) and
+    asyncio callers (do_async) are coalesced separately.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Tuple[int, Hashable], "asyncio.Future[Any]"] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """Run fn for key, or wait up to timeout seconds for the in-flight run.
+
+        Raises TimeoutError if a waiter gives up; the leader itself is never
+        interrupted.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if leader:
+            try:
+                call.value = fn()
+            except BaseException as exc:
+                call.error = exc
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+            return call.value
+
+        LLM_COALESCED.inc(operation=current_operation())
+        if not call.done.wait(timeout):
+            raise TimeoutError(f"timed out after {timeout}s waiting for an identical in-flight request")
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        """asyncio version of do(); calls are coalesced per event loop.
+
+        The shared run is a task of its own, so cancelling or timing out one
+        caller does not cancel it for the others.
+        """
+        task_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            leader = task is None
+            if leader:
+                task = self._tasks[task_key] = asyncio.ensure_future(fn())
+                task.add_done_callback(lambda done: self._finish_task(task_key, done))
+
+        if not leader:
+            LLM_COALESCED.inc(operation=current_operation())
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"timed out after {timeout}s waiting for an identical in-flight request") from None
+
+    def _finish_task(self, task_key: Tuple[int, Hashable], task: "asyncio.Future[Any]"):
+        with self._lock:
+            if self._tasks.get(task_key) is task:
+                del self._tasks[task_key]
+        # Mark the exception as retrieved in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls) + len(self._tasks)
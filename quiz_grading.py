@@ -0,0 +1,84 @@
+import bisect
+import threading
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Byte codes for answers that can never match an answer key entry
+_MISSING = ord(" ")
+_INVALID = ord("\0")
+
+
+def _encode(answer: str, upper: bool) -> int:
+    # Single ASCII letters become their byte value; anything else cannot be correct
+    if len(answer) != 1 or not answer.isascii():
+        return _INVALID
+    return ord(answer.upper() if upper else answer)
+
+
+def encode_answer_key(questions: Sequence[Dict[str, Any]]) -> np.ndarray:
+    return np.array([_encode(str(q['correct_answer']), upper=False) for q in questions], dtype=np.uint8)
+
+
+def encode_submissions(submissions: Sequence[Sequence[str]], num_questions: int) -> np.ndarray:
+    """(n_submissions, num_questions) uint8 matrix; unanswered questions are padded as missing.
+
+    Answers are upper-cased like take_quiz does, extra answers are ignored.
+    """
+    matrix = np.full((len(submissions), num_questions), _MISSING, dtype=np.uint8)
+    for row, answers in enumerate(submissions):
+        codes = [_encode(answer, upper=True) for answer in answers[:num_questions]]
+        matrix[row, :len(codes)] = codes
+    return matrix
+
+
+def grade_matrix(answer_key: np.ndarray, submissions: np.ndarray) -> Dict[str, np.ndarray]:
+    """Grade every submission in one vectorised pass.
+
+    Returns the boolean correctness matrix, per-submission scores, the
+    per-question correct rate and item difficulty (1 - correct rate).
+    """
+    correct = submissions == answer_key[np.newaxis, :]
+    correct_rate = correct.mean(axis=0) if len(submissions) else np.zeros(len(answer_key))
+    return {
+        'correct': correct,
+        'scores': correct.sum(axis=1),
+        'correct_rate': correct_rate,
+        'item_difficulty': 1.0 - correct_rate,
+    }
+
+
+class QuizHistory:
+    """Attempts indexed by (user_id, quiz_id) with O(1) latest/best lookups.
+
+    Entries are kept in 'attempt' order and recording one that is already
+    indexed is a no-op, so a user's stored history can be re-recorded to pick
+    up attempts made by other worker processes.
+    """
+
+    def __init__(self):
+        self._attempts: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        self._best: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, user_id: str, quiz_id: str, entry: Dict[str, Any]):
+        key = (user_id, quiz_id)
+        with self._lock:
+            attempts = self._attempts.setdefault(key, [])
+            index = bisect.bisect_left(attempts, entry['attempt'], key=lambda known: known['attempt'])
+            if index < len(attempts) and attempts[index]['attempt'] == entry['attempt']:
+                return
+            attempts.insert(index, entry)
+            best = self._best.get(key)
+            if best is None or entry['score'] > best['score']:
+                self._best[key] = entry
+
+    def latest(self, user_id: str, quiz_id: str) -> Dict[str, Any] | None:
+        attempts = self._attempts.get((user_id, quiz_id))
+        return attempts[-1] if attempts else None
+
+    def best(self, user_id: str, quiz_id: str) -> Dict[str, Any] | None:
+        return self._best.get((user_id, quiz_id))
+
+    def attempts(self, user_id: str, quiz_id: str) -> List[Dict[str, Any]]:
+        return list(self._attempts.get((user_id, quiz_id), []))
@@ -0,0 +1,168 @@
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Set, Tuple
+
+import numpy as np
+
+# (topic, difficulty, num_questions)
+QuizKey = Tuple[str, str, int]
+Questions = List[Dict[str, Any]]
+
+
+def quiz_key(topic: str, difficulty: str, num_questions: int) -> QuizKey:
+    """Collapse stray whitespace, as in the quiz prompt, so requests for the same quiz share a pool."""
+    return " ".join(topic.split()), " ".join(difficulty.split()), num_questions
+
+
+class QuizPool:
+    """Pre-generated quizzes per (topic, difficulty, num_questions), refilled in the background.
+
+    Once a key has been requested, worker threads keep between low_watermark
+    and high_watermark quizzes ready for it. Quizzes older than max_age
+    seconds are evicted instead of being served.
+    """
+
+    def __init__(self, generate: Callable[[str, str, int], Questions], low_watermark: int = 2,
+                 high_watermark: int = 5, workers: int = 2, max_age: float | None = 24 * 60 * 60,
+                 wait_timeout: float = 0.0):
+        if not 0 <= low_watermark < high_watermark:
+            raise ValueError("expected 0 <= low_watermark < high_watermark")
+        self.generate = generate
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.max_age = max_age
+        self.wait_timeout = wait_timeout
+
+        self._ready: Dict[QuizKey, Deque[Tuple[Questions, float]]] = {}
+        self._scheduled: Set[QuizKey] = set()
+        # Failed refills per key, so waiting take() calls can stop waiting
+        self._failed: Dict[QuizKey, int] = {}
+        self._refills: "queue.Queue[QuizKey | None]" = queue.Queue()
+        self._latencies: Deque[float] = deque(maxlen=1000)
+        self._counts = {"hits": 0, "misses": 0, "waits": 0, "generated": 0, "failures": 0, "evicted": 0}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._workers = [threading.Thread(target=self._work, name=f"quiz-pool-{i}", daemon=True)
+                         for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def warm(self, topic: str, difficulty: str, num_questions: int):
+        """Start filling a key before anyone asks for it."""
+        key = quiz_key(topic, difficulty, num_questions)
+        with self._cond:
+            self._ready.setdefault(key, deque())
+            self._schedule(key)
+
+    def take(self, topic: str, difficulty: str, num_questions: int) -> Questions | None:
+        """Pop a ready quiz, or None on a cold key (the key is then scheduled for refill).
+
+        On a warm key whose pool is momentarily empty this returns None at
+        once, so the caller generates the quiz itself, unless wait_timeout
+        allows waiting for the refill in progress (giving up early if it fails).
+        """
+        key = quiz_key(topic, difficulty, num_questions)
+        deadline = time.monotonic() + self.wait_timeout
+        with self._cond:
+            if key not in self._ready:
+                self._ready[key] = deque()
+                self._schedule(key)
+                self._counts["misses"] += 1
+                return None
+            ready = self._ready[key]
+            failed = self._failed.get(key, 0)
+            waited = False
+            while True:
+                self._evict_stale(ready)
+                if ready:
+                    questions, _ = ready.popleft()
+                    self._counts["waits" if waited else "hits"] += 1
+                    if len(ready) < self.low_watermark:
+                        self._schedule(key)
+                    return questions
+                self._schedule(key)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._closed or self._failed.get(key, 0) != failed:
+                    self._counts["misses"] += 1
+                    return None
+                waited = True
+                self._cond.wait(remaining)
+
+    def _schedule(self, key: QuizKey):
+        if key not in self._scheduled and not self._closed:
+            self._scheduled.add(key)
+            self._refills.put(key)
+
+    def _evict_stale(self, ready: Deque[Tuple[Questions, float]]):
+        if self.max_age is None:
+            return
+        cutoff = time.time() - self.max_age
+        # Oldest quizzes sit at the left
+        while ready and ready[0][1] < cutoff:
+            ready.popleft()
+            self._counts["evicted"] += 1
+
+    def _work(self):
+        while True:
+            key = self._refills.get()
+            if key is None:
+                return
+            try:
+                self._refill(key)
+            finally:
+                with self._cond:
+                    self._scheduled.discard(key)
+                    # Waiters that found the key still scheduled can now reschedule it
+                    self._cond.notify_all()
+
+    def _refill(self, key: QuizKey):
+        while True:
+            with self._cond:
+                ready = self._ready[key]
+                self._evict_stale(ready)
+                if self._closed or len(ready) >= self.high_watermark:
+                    return
+            started = time.monotonic()
+            try:
+                questions = self.generate(*key)
+            except Exception:
+                with self._cond:
+                    self._counts["failures"] += 1
+                    self._failed[key] = self._failed.get(key, 0) + 1
+                    self._cond.notify_all()
+                # Give up this round; the next take() reschedules the key
+                return
+            with self._cond:
+                self._latencies.append(time.monotonic() - started)
+                self._counts["generated"] += 1
+                ready.append((questions, time.time()))
+                self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats: Dict[str, Any] = dict(self._counts)
+            stats["depth"] = {key: len(ready) for key, ready in self._ready.items()}
+            stats["refilling"] = sorted(self._scheduled)
+            latencies = np.array(self._latencies)
+        if len(latencies):
+            stats["refill_latency"] = {
+                "count": len(latencies),
+                "mean": float(latencies.mean()),
+                "p50": float(np.percentile(latencies, 50)),
+                "p95": float(np.percentile(latencies, 95)),
+                "max": float(latencies.max()),
+            }
+        else:
+            stats["refill_latency"] = {"count": 0}
+        return stats
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for _ in self._workers:
+            self._refills.put(None)
+        for worker in self._workers:
+            worker.join()
@@ -0,0 +1,168 @@
+import threading
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+
+def _grown(matrix: np.ndarray, rows: int, cols: int) -> np.ndarray:
+    """matrix copied into a zero matrix with capacity for at least rows x cols, doubling as needed."""
+    capacity_rows, capacity_cols = matrix.shape
+    while capacity_rows < rows:
+        capacity_rows *= 2
+    while capacity_cols < cols:
+        capacity_cols *= 2
+    if (capacity_rows, capacity_cols) == matrix.shape:
+        return matrix
+    grown = np.zeros((capacity_rows, capacity_cols), dtype=matrix.dtype)
+    grown[:matrix.shape[0], :matrix.shape[1]] = matrix
+    return grown
+
+
+def _top_columns(matrix: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of each row's k largest values, largest first; ties go to the lower column."""
+    # Gap scores tie a lot (every skill a user never touched scores 1) and introselect
+    # crawls on ties, so small k takes k argmax passes, which pick the first maximum
+    if k <= 32:
+        remaining = matrix.copy()
+        rows = np.arange(matrix.shape[0])
+        top = np.empty((matrix.shape[0], k), dtype=np.int64)
+        for i in range(k):
+            top[:, i] = remaining.argmax(axis=1)
+            remaining[rows, top[:, i]] = -np.inf
+        return top
+    # Otherwise nudge each value down by its column index so that every value is distinct
+    key = matrix.astype(np.float64) - np.arange(matrix.shape[1]) * 1e-12
+    if k < matrix.shape[1]:
+        top = np.argpartition(-key, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(matrix.shape[1]), matrix.shape)
+    order = np.argsort(-np.take_along_axis(key, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+class SkillMatrix:
+    """Dense user x skill and content x skill matrices over one skill vocabulary.
+
+    A skill gets a column the first time content or an assessment names it.
+    A user's row holds their skill scores (0-1, 0 when never assessed) and
+    a content row spreads a weight of 1/n over its n skills, so
+    (1 - users) @ content.T is every user's average skill gap on every
+    content item in one product. Rows and columns double in capacity as
+    they fill, like VideoCatalog's counter columns.
+    """
+
+    def __init__(self):
+        self._skills: Dict[str, int] = {}
+        self._skill_names: List[str] = []
+        self._users: Dict[str, int] = {}
+        self._user_ids: List[str] = []
+        self._content: Dict[str, int] = {}
+        self._content_ids: List[str] = []
+        # Skill columns of each content row, for per-pick lookups without scanning the row
+        self._content_columns: List[Tuple[int, ...]] = []
+        self._user_scores = np.zeros((64, 16), dtype=np.float32)
+        self._content_weights = np.zeros((16, 16), dtype=np.float32)
+        self._lock = threading.Lock()
+
+    @property
+    def skills(self) -> List[str]:
+        return list(self._skill_names)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._users
+
+    def _columns(self, skills: Iterable[str]) -> List[int]:
+        columns = []
+        width = len(self._skill_names)
+        for skill in skills:
+            column = self._skills.get(skill)
+            if column is None:
+                column = self._skills[skill] = len(self._skill_names)
+                self._skill_names.append(skill)
+            columns.append(column)
+        if len(self._skill_names) > width:
+            width = len(self._skill_names)
+            self._user_scores = _grown(self._user_scores, self._user_scores.shape[0], width)
+            self._content_weights = _grown(self._content_weights, self._content_weights.shape[0], width)
+        return columns
+
+    def set_content(self, content_id: str, skills: Sequence[str]):
+        with self._lock:
+            columns = self._columns(dict.fromkeys(skills))
+            row = self._content.get(content_id)
+            if row is None:
+                row = self._content[content_id] = len(self._content_ids)
+                self._content_ids.append(content_id)
+                self._content_columns.append(())
+                self._content_weights = _grown(self._content_weights, row + 1, self._content_weights.shape[1])
+            self._content_weights[row] = 0.0
+            if columns:
+                self._content_weights[row, columns] = 1.0 / len(columns)
+            self._content_columns[row] = tuple(columns)
+
+    def set_user_skills(self, user_id: str, scores: Dict[str, float], replace: bool = False):
+        """Write a user's skill scores in place; replace=True clears skills not in scores."""
+        with self._lock:
+            columns = self._columns(scores)
+            row = self._users.get(user_id)
+            if row is None:
+                row = self._users[user_id] = len(self._user_ids)
+                self._user_ids.append(user_id)
+                self._user_scores = _grown(self._user_scores, row + 1, self._user_scores.shape[1])
+            elif replace:
+                self._user_scores[row] = 0.0
+            if columns:
+                self._user_scores[row, columns] = np.clip(np.fromiter(scores.values(), dtype=np.float32,
+                                                                      count=len(columns)), 0.0, 1.0)
+
+    def _snapshot(self) -> Tuple[np.ndarray, np.ndarray, List[str], List[str]]:
+        # Views of the filled part; growth swaps in new arrays, so these stay consistent
+        with self._lock:
+            users, content, width = len(self._user_ids), len(self._content_ids), len(self._skill_names)
+            return (self._user_scores[:users, :width], self._content_weights[:content, :width],
+                    self._user_ids[:users], self._content_ids[:content])
+
+    def gap_scores(self, user_ids: Sequence[str] | None = None) -> np.ndarray:
+        """(users, content) average gap between each user's scores and each content item's skills."""
+        scores, weights, _, _ = self._snapshot()
+        if user_ids is not None:
+            scores = scores[[self._users[user_id] for user_id in user_ids]]
+        return (1.0 - scores) @ weights.T
+
+    def top_k(self, user_ids: Sequence[str] | None = None, k: int = 3,
+              block_size: int = 4096) -> Dict[str, List[Tuple[str, float]]]:
+        """The k content items with the largest gap for each user, best first.
+
+        Users are scored block_size rows at a time so the (users, content)
+        gap matrix never has to exist in full. Content without skills scores 0.
+        """
+        scores, weights, all_users, content_ids = self._snapshot()
+        if user_ids is None:
+            user_ids = all_users
+            rows = np.arange(len(all_users))
+        else:
+            rows = np.fromiter((self._users[user_id] for user_id in user_ids), dtype=np.int64, count=len(user_ids))
+        k = min(k, len(content_ids))
+        picks: Dict[str, List[Tuple[str, float]]] = {}
+        if k <= 0:
+            return {user_id: [] for user_id in user_ids}
+
+        gaps_from = np.ascontiguousarray(weights.T)
+        for start in range(0, len(rows), block_size):
+            block = rows[start:start + block_size]
+            gaps = (1.0 - scores[block]) @ gaps_from
+            top = _top_columns(gaps, k)
+            top_gaps = np.take_along_axis(gaps, top, axis=1)
+            for offset, (columns, values) in enumerate(zip(top.tolist(), top_gaps.tolist())):
+                picks[user_ids[start + offset]] = [(content_ids[column], value)
+                                                   for column, value in zip(columns, values)]
+        return picks
+
+    def skill_gaps(self, user_id: str, content_id: str) -> List[Tuple[str, float]]:
+        """(skill, 1 - user score) for the content's skills the user has not mastered, largest gap first."""
+        columns = self._content_columns[self._content[content_id]]
+        row = self._users.get(user_id)
+        scores = self._user_scores[row] if row is not None else None
+        gaps = [(self._skill_names[column], 1.0 - (scores.item(column) if scores is not None else 0.0))
+                for column in columns]
+        return sorted((gap for gap in gaps if gap[1] > 0), key=lambda gap: gap[1], reverse=True)
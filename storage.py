@@ -0,0 +1,367 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterator, List, MutableMapping, Optional, Protocol
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS content (
+    content_id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    skills TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS content_skills (
+    content_id TEXT NOT NULL,
+    skill TEXT NOT NULL,
+    PRIMARY KEY (content_id, skill)
+);
+CREATE INDEX IF NOT EXISTS content_skills_skill ON content_skills (skill);
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    goals TEXT,
+    background TEXT
+);
+CREATE TABLE IF NOT EXISTS user_skills (
+    user_id TEXT NOT NULL,
+    skill TEXT NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (user_id, skill)
+);
+CREATE TABLE IF NOT EXISTS quizzes (
+    quiz_id TEXT PRIMARY KEY,
+    topic TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    questions TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS quizzes_topic ON quizzes (topic, difficulty);
+CREATE TABLE IF NOT EXISTS quiz_attempts (
+    user_id TEXT NOT NULL,
+    quiz_id TEXT NOT NULL,
+    attempt INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    total_questions INTEGER NOT NULL,
+    taken_at REAL NOT NULL,
+    PRIMARY KEY (user_id, quiz_id, attempt)
+);
+CREATE INDEX IF NOT EXISTS quiz_attempts_quiz ON quiz_attempts (quiz_id);
+CREATE TABLE IF NOT EXISTS topic_stats (
+    user_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    ewma REAL NOT NULL,
+    trend REAL NOT NULL,
+    last_score REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (user_id, kind, topic)
+);
+"""
+
+
+class Storage(Protocol):
+    def batch(self):
+        ...
+
+    def put_content(self, content_id: str, title: str, description: str, skills: List[str]):
+        ...
+
+    def get_content(self, content_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    def all_content(self) -> Dict[str, Dict[str, Any]]:
+        ...
+
+    def put_user(self, user_id: str, goals: Optional[str], background: Optional[str]):
+        ...
+
+    def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    def all_users(self) -> Dict[str, Dict[str, Any]]:
+        ...
+
+    def set_skills(self, user_id: str, scores: Dict[str, float], replace: bool = False):
+        ...
+
+    def put_quiz(self, quiz_id: str, topic: str, difficulty: str, questions: List[Dict[str, Any]]):
+        ...
+
+    def get_quiz(self, quiz_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    def all_quizzes(self) -> Dict[str, Dict[str, Any]]:
+        ...
+
+    def add_attempt(self, user_id: str, quiz_id: str, score: int, total_questions: int) -> int:
+        ...
+
+    def attempts(self, user_id: str) -> List[Dict[str, Any]]:
+        ...
+
+    def all_attempts(self) -> Dict[str, List[Dict[str, Any]]]:
+        ...
+
+    def topic_stats(self, user_id: str, kind: str) -> Dict[str, Dict[str, Any]]:
+        ...
+
+    def get_topic_stats(self, user_id: str, kind: str, topic: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    def put_topic_stats(self, user_id: str, kind: str, topic: str, stats: Dict[str, Any]):
+        ...
+
+
+class SQLiteStorage:
+    """SQLite-backed store for content, users, skills, quizzes and quiz attempts.
+
+    Every write is its own transaction unless it runs inside `with batch():`,
+    which commits all enclosed writes together.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+
+    @contextmanager
+    def batch(self):
+        with self._lock:
+            if self._batch_depth == 0:
+                self._db.execute("BEGIN IMMEDIATE")
+            self._batch_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._db.execute("ROLLBACK")
+                raise
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._db.execute("COMMIT")
+
+    def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def put_content(self, content_id: str, title: str, description: str, skills: List[str]):
+        with self.batch():
+            self._db.execute("INSERT OR REPLACE INTO content VALUES (?, ?, ?, ?)",
+                             (content_id, title, description, json.dumps(skills)))
+            self._db.execute("DELETE FROM content_skills WHERE content_id = ?", (content_id,))
+            self._db.executemany("INSERT OR IGNORE INTO content_skills VALUES (?, ?)",
+                                 [(content_id, skill) for skill in skills])
+
+    def get_content(self, content_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._query("SELECT title, description, skills FROM content WHERE content_id = ?", (content_id,))
+        if not rows:
+            return None
+        title, description, skills = rows[0]
+        return {"title": title, "description": description, "skills": json.loads(skills)}
+
+    def all_content(self) -> Dict[str, Dict[str, Any]]:
+        return {content_id: {"title": title, "description": description, "skills": json.loads(skills)}
+                for content_id, title, description, skills
+                in self._query("SELECT content_id, title, description, skills FROM content ORDER BY rowid")}
+
+    def content_with_skill(self, skill: str) -> List[str]:
+        return [row[0] for row in self._query("SELECT content_id FROM content_skills WHERE skill = ?", (skill,))]
+
+    def put_user(self, user_id: str, goals: Optional[str], background: Optional[str]):
+        with self.batch():
+            self._db.execute(
+                "INSERT INTO users VALUES (?, ?, ?) ON CONFLICT(user_id) DO UPDATE SET "
+                "goals = excluded.goals, background = excluded.background",
+                (user_id, goals, background),
+            )
+
+    def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._query("SELECT goals, background FROM users WHERE user_id = ?", (user_id,))
+        if not rows:
+            return None
+        goals, background = rows[0]
+        skills = dict(self._query("SELECT skill, score FROM user_skills WHERE user_id = ?", (user_id,)))
+        return {"goals": goals, "background": background, "skills": skills}
+
+    def all_users(self) -> Dict[str, Dict[str, Any]]:
+        users = {user_id: {"goals": goals, "background": background, "skills": {}}
+                 for user_id, goals, background in self._query("SELECT user_id, goals, background FROM users ORDER BY rowid")}
+        for user_id, skill, score in self._query("SELECT user_id, skill, score FROM user_skills"):
+            if user_id in users:
+                users[user_id]["skills"][skill] = score
+        return users
+
+    def set_skills(self, user_id: str, scores: Dict[str, float], replace: bool = False):
+        with self.batch():
+            if replace:
+                self._db.execute("DELETE FROM user_skills WHERE user_id = ?", (user_id,))
+            self._db.executemany("INSERT OR REPLACE INTO user_skills VALUES (?, ?, ?)",
+                                 [(user_id, skill, score) for skill, score in scores.items()])
+
+    def put_quiz(self, quiz_id: str, topic: str, difficulty: str, questions: List[Dict[str, Any]]):
+        with self.batch():
+            self._db.execute("INSERT OR REPLACE INTO quizzes VALUES (?, ?, ?, ?, ?)",
+                             (quiz_id, topic, difficulty, json.dumps(questions), time.time()))
+
+    def get_quiz(self, quiz_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._query("SELECT topic, difficulty, questions FROM quizzes WHERE quiz_id = ?", (quiz_id,))
+        if not rows:
+            return None
+        topic, difficulty, questions = rows[0]
+        return {"topic": topic, "difficulty": difficulty, "questions": json.loads(questions)}
+
+    def all_quizzes(self) -> Dict[str, Dict[str, Any]]:
+        return {quiz_id: {"topic": topic, "difficulty": difficulty, "questions": json.loads(questions)}
+                for quiz_id, topic, difficulty, questions
+                in self._query("SELECT quiz_id, topic, difficulty, questions FROM quizzes ORDER BY rowid")}
+
+    def add_attempt(self, user_id: str, quiz_id: str, score: int, total_questions: int) -> int:
+        """Record an attempt and return its 1-based attempt number for (user, quiz)."""
+        with self.batch():
+            (last,), = self._db.execute(
+                "SELECT COALESCE(MAX(attempt), 0) FROM quiz_attempts WHERE user_id = ? AND quiz_id = ?",
+                (user_id, quiz_id),
+            ).fetchall()
+            self._db.execute("INSERT INTO quiz_attempts VALUES (?, ?, ?, ?, ?, ?)",
+                             (user_id, quiz_id, last + 1, score, total_questions, time.time()))
+        return last + 1
+
+    def attempts(self, user_id: str) -> List[Dict[str, Any]]:
+        return [{"quiz_id": quiz_id, "attempt": attempt, "score": score, "total_questions": total}
+                for quiz_id, attempt, score, total in self._query(
+                    "SELECT quiz_id, attempt, score, total_questions FROM quiz_attempts "
+                    "WHERE user_id = ? ORDER BY taken_at, rowid", (user_id,))]
+
+    def all_attempts(self) -> Dict[str, List[Dict[str, Any]]]:
+        history: Dict[str, List[Dict[str, Any]]] = {}
+        for user_id, quiz_id, attempt, score, total in self._query(
+                "SELECT user_id, quiz_id, attempt, score, total_questions FROM quiz_attempts ORDER BY taken_at, rowid"):
+            history.setdefault(user_id, []).append(
+                {"quiz_id": quiz_id, "attempt": attempt, "score": score, "total_questions": total})
+        return history
+
+    def topic_stats(self, user_id: str, kind: str) -> Dict[str, Dict[str, Any]]:
+        return {topic: {"attempts": attempts, "ewma": ewma, "trend": trend, "last_score": last_score,
+                        "last_seen": last_seen}
+                for topic, attempts, ewma, trend, last_score, last_seen in self._query(
+                    "SELECT topic, attempts, ewma, trend, last_score, last_seen FROM topic_stats "
+                    "WHERE user_id = ? AND kind = ?", (user_id, kind))}
+
+    def get_topic_stats(self, user_id: str, kind: str, topic: str) -> Optional[Dict[str, Any]]:
+        rows = self._query("SELECT attempts, ewma, trend, last_score, last_seen FROM topic_stats "
+                           "WHERE user_id = ? AND kind = ? AND topic = ?", (user_id, kind, topic))
+        if not rows:
+            return None
+        attempts, ewma, trend, last_score, last_seen = rows[0]
+        return {"attempts": attempts, "ewma": ewma, "trend": trend, "last_score": last_score,
+                "last_seen": last_seen}
+
+    def put_topic_stats(self, user_id: str, kind: str, topic: str, stats: Dict[str, Any]):
+        with self.batch():
+            self._db.execute("INSERT OR REPLACE INTO topic_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (user_id, kind, topic, stats["attempts"], stats["ewma"], stats["trend"],
+                              stats["last_score"], stats["last_seen"]))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class CachedTable(MutableMapping):
+    """Dict-like read-through cache over one storage table.
+
+    Reads load a record once and keep it; writes go to storage first, and
+    refresh(key) reloads a record other processes may have changed. The
+    first full iteration loads every record in one query. Nested values
+    (e.g. a user's skills dict) are cached objects, so in-place edits must be
+    persisted by the owner through the storage API.
+    """
+
+    def __init__(self, load: Callable[[Hashable], Any], save: Callable[[Hashable, Any], None],
+                 load_all: Callable[[], Dict[Hashable, Any]]):
+        self._load = load
+        self._save = save
+        self._load_all = load_all
+        self._cache: Dict[Hashable, Any] = {}
+        self._complete = False
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key: Hashable) -> Any:
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        if self._complete:
+            raise KeyError(key)
+        value = self._load(key)
+        if value is None:
+            raise KeyError(key)
+        with self._lock:
+            return self._cache.setdefault(key, value)
+
+    def __setitem__(self, key: Hashable, value: Any):
+        self._save(key, value)
+        with self._lock:
+            self._cache[key] = value
+
+    def __delitem__(self, key: Hashable):
+        raise TypeError("records cannot be deleted through this view")
+
+    def _ensure_complete(self):
+        if not self._complete:
+            records = self._load_all()
+            with self._lock:
+                for key, value in records.items():
+                    self._cache.setdefault(key, value)
+                self._complete = True
+
+    def __iter__(self) -> Iterator[Hashable]:
+        self._ensure_complete()
+        return iter(list(self._cache))
+
+    def __len__(self) -> int:
+        self._ensure_complete()
+        return len(self._cache)
+
+    def __contains__(self, key: object) -> bool:
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def refresh(self, key: Hashable) -> Any:
+        value = self._load(key)
+        with self._lock:
+            if value is None:
+                self._cache.pop(key, None)
+                raise KeyError(key)
+            self._cache[key] = value
+            return value
+
+    def invalidate(self):
+        with self._lock:
+            self._cache.clear()
+            self._complete = False
+
+
+_default_storage: Optional[SQLiteStorage] = None
+_default_lock = threading.Lock()
+
+
+def get_default_storage() -> SQLiteStorage:
+    """Process-wide SQLite store at $BYTESIZE_DB (default ./bytesize.db)."""
+    global _default_storage
+    with _default_lock:
+        if _default_storage is None:
+            _default_storage = SQLiteStorage(os.getenv("BYTESIZE_DB", "bytesize.db"))
+        return _default_storage
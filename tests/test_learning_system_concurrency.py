@@ -0,0 +1,48 @@
+import threading
+import time
+
+from benchmarks.fake_genai import FakeGenAI
+from llm.cache import ResponseCache
+from llm.client import ModelRegistry
+from LLMEnhancedLearningSystem import LLMEnhancedLearningSystem
+from storage import SQLiteStorage
+
+
+def test_recommend_content_and_assess_skills_do_not_deadlock():
+    # assess_skills records skill stats inside storage.batch() while recommend_content
+    # describes new users' skills, loading their summaries from storage
+    system = LLMEnhancedLearningSystem(response_cache=ResponseCache(),
+                                       model_registry=ModelRegistry(api_key="test", genai=FakeGenAI()),
+                                       storage=SQLiteStorage())
+    system.add_content("c1", "Python basics", "Variables and loops", ["python", "loops"])
+    for i in range(300):
+        system.add_user(f"reader-{i}", "Learn Python", "Beginner")
+    for i in range(2):
+        system.add_user(f"assessed-{i}", "Learn Python", "Beginner")
+    errors = []
+
+    def recommend():
+        try:
+            for i in range(300):
+                system.recommend_content(f"reader-{i}")
+        except Exception as exc:
+            errors.append(exc)
+
+    def assess(worker: int):
+        try:
+            for i in range(300):
+                system.assess_skills(f"assessed-{worker}", "c1", f"answer {i}")
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=recommend, daemon=True)]
+    threads += [threading.Thread(target=assess, args=(worker,), daemon=True) for worker in range(2)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 30
+    for thread in threads:
+        thread.join(timeout=max(0.0, deadline - time.monotonic()))
+
+    assert not any(thread.is_alive() for thread in threads), "recommend_content and assess_skills deadlocked"
+    assert errors == []
+    assert system.skill_summaries.get("assessed-1")
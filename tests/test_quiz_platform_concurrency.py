@@ -0,0 +1,48 @@
+import threading
+import time
+
+from benchmarks.fake_genai import FakeGenAI
+from llm.cache import ResponseCache
+from llm.client import ModelRegistry
+from LLMEnhancedQuizPlatform import LLMEnhancedQuizPlatform
+from storage import SQLiteStorage
+
+QUESTIONS = [{"question": f"Q{i}", "options": ["A) a", "B) b", "C) c", "D) d"], "correct_answer": "A",
+              "explanation": "a"} for i in range(5)]
+
+
+def test_grade_batch_and_take_quiz_do_not_deadlock():
+    # grade_batch records attempts inside storage.batch() while take_quiz indexes new
+    # users' history; every user is new so both take the slow, locking path
+    platform = LLMEnhancedQuizPlatform(response_cache=ResponseCache(),
+                                       model_registry=ModelRegistry(api_key="test", genai=FakeGenAI()),
+                                       storage=SQLiteStorage())
+    platform.quizzes["q1"] = {"topic": "Python", "difficulty": "Beginner", "questions": QUESTIONS}
+    errors = []
+
+    def grade(worker: int):
+        try:
+            for i in range(200):
+                platform.grade_batch("q1", {f"batch-{worker}-{i}-{j}": ["A"] * 5 for j in range(5)})
+        except Exception as exc:
+            errors.append(exc)
+
+    def take(worker: int):
+        try:
+            for i in range(500):
+                platform.take_quiz(f"single-{worker}-{i}", "q1", ["A", "B", "A", "B", "A"])
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=target, args=(worker,), daemon=True)
+               for worker in range(2) for target in (grade, take)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 30
+    for thread in threads:
+        thread.join(timeout=max(0.0, deadline - time.monotonic()))
+
+    assert not any(thread.is_alive() for thread in threads), "grade_batch and take_quiz deadlocked"
+    assert errors == []
+    assert platform.latest_attempt("single-0-499", "q1")["score"] == 3
+    assert platform.latest_attempt("batch-1-199-4", "q1")["score"] == 5
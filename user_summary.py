@@ -0,0 +1,115 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from storage import Storage
+
+
+@dataclass
+class TopicStats:
+    """Rolling aggregate of one user's scores (0-1) on one topic or skill."""
+    attempts: int = 0
+    ewma: float = 0.0
+    # EWMA of score - previous ewma: > 0 means the user is improving
+    trend: float = 0.0
+    last_score: float = 0.0
+    last_seen: float = 0.0
+
+    def update(self, score: float, alpha: float, seen_at: float) -> "TopicStats":
+        if self.attempts == 0:
+            self.ewma = score
+        else:
+            self.trend = alpha * (score - self.ewma) + (1 - alpha) * self.trend
+            self.ewma = alpha * score + (1 - alpha) * self.ewma
+        self.attempts += 1
+        self.last_score = score
+        self.last_seen = seen_at
+        return self
+
+    def describe(self, topic: str) -> str:
+        seen = time.strftime("%Y-%m-%d", time.localtime(self.last_seen)) if self.last_seen else "unknown"
+        return (f"{topic}: {self.attempts} attempt{'s' if self.attempts != 1 else ''}, "
+                f"recent average {self.ewma:.0%}, trend {self.trend:+.0%}, "
+                f"last score {self.last_score:.0%}, last seen {seen}")
+
+
+class UserSummaries:
+    """Per-user TopicStats for one kind of activity ("quiz" topics or assessed "skill"s).
+
+    Each record() is O(1) and persisted straight away, so prompts can use
+    describe() — at most prompt_topics lines, most recent first — instead of
+    the user's full history. record() updates the stored row inside one write
+    transaction, so worker processes sharing the database never overwrite
+    each other's updates; stats loaded by get() may lag behind them. A user without stored stats is seeded once from
+    `backfill(user_id)`, which yields (topic, score) pairs oldest first.
+    """
+
+    def __init__(self, storage: Storage, kind: str, alpha: float = 0.3, prompt_topics: int = 10,
+                 backfill: Callable[[str], Iterable[Tuple[str, float]]] | None = None):
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1]")
+        self.storage = storage
+        self.kind = kind
+        self.alpha = alpha
+        self.prompt_topics = prompt_topics
+        self.backfill = backfill
+        self._users: Dict[str, Dict[str, TopicStats]] = {}
+        self._lock = threading.RLock()
+
+    def get(self, user_id: str) -> Dict[str, TopicStats]:
+        summary = self._users.get(user_id)
+        if summary is not None:
+            return summary
+        # Plain reads: a write transaction here would serialise cold reads against every writer
+        summary = {topic: TopicStats(**stats)
+                   for topic, stats in self.storage.topic_stats(user_id, self.kind).items()}
+        if not summary and self.backfill is not None:
+            summary = self._backfill(user_id)
+        with self._lock:
+            return self._users.setdefault(user_id, summary)
+
+    def _backfill(self, user_id: str) -> Dict[str, TopicStats]:
+        with self.storage.batch():
+            # Another worker may have recorded or backfilled this user since get() looked
+            stored = self.storage.topic_stats(user_id, self.kind)
+            if stored:
+                return {topic: TopicStats(**stats) for topic, stats in stored.items()}
+            summary: Dict[str, TopicStats] = {}
+            for topic, score in self.backfill(user_id):
+                summary.setdefault(topic, TopicStats()).update(score, self.alpha, 0.0)
+            for topic, stats in summary.items():
+                self.storage.put_topic_stats(user_id, self.kind, topic, vars(stats))
+        return summary
+
+    def record(self, user_id: str, topic: str, score: float, seen_at: float | None = None) -> TopicStats:
+        summary = self.get(user_id)
+        with self.storage.batch():
+            # Update the stored row, not the cached one, which misses other workers' updates
+            stored = self.storage.get_topic_stats(user_id, self.kind, topic)
+            stats = TopicStats(**stored) if stored is not None else TopicStats()
+            stats.update(score, self.alpha, seen_at if seen_at is not None else time.time())
+            self.storage.put_topic_stats(user_id, self.kind, topic, vars(stats))
+            with self._lock:
+                summary[topic] = stats
+            return stats
+
+    def recent(self, user_id: str) -> List[Tuple[str, TopicStats]]:
+        # Loaded before taking _lock, which is never held while calling storage
+        summary = self.get(user_id)
+        with self._lock:
+            items = list(summary.items())
+        items.sort(key=lambda item: item[1].last_seen, reverse=True)
+        return items[:self.prompt_topics]
+
+    def describe(self, user_id: str) -> str:
+        """Fixed-size prompt text: one line per recently active topic."""
+        summary = self.get(user_id)
+        recent = self.recent(user_id)
+        if not recent:
+            return "None yet"
+        lines = [f"- {stats.describe(topic)}" for topic, stats in recent]
+        others = len(summary) - len(recent)
+        if others > 0:
+            lines.append(f"- ...and {others} older topic{'s' if others != 1 else ''}")
+        return "\n        ".join(lines)